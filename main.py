@@ -20,26 +20,45 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from time import time
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from pyrogram import Client
 
 from plugins import glovar
+from plugins.functions.etc import thread
+from plugins.functions.file import flush, load_data, save_worker
 from plugins.functions.timers import backup_files, interval_hour_01, reset_count, update_status
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
+# Load data while the client connects
+start = time()
+thread(load_data, ())
+
 # Config session
 app = Client(
     session_name="bot",
     bot_token=glovar.bot_token
 )
 app.start()
+glovar.startup_times["client"] = time() - start
+
+# Wait for the data, the handlers hold the updates until then
+glovar.ready.wait()
+glovar.startup_times["ready"] = time() - start
+
+if not glovar.loaded:
+    app.stop()
+    raise SystemExit("[DATA CORRUPTION]")
 
 # Send online status
 update_status(app, "online")
 
+# Save files in one thread
+thread(save_worker, ())
+
 # Timer
 scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
 scheduler.add_job(interval_hour_01, "interval", [app], hours=1)
@@ -53,3 +72,6 @@ app.idle()
 
 # Stop
 app.stop()
+
+# Write the files still in the save queue
+flush()
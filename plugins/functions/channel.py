@@ -18,13 +18,13 @@
 
 import logging
 from json import dumps
-from typing import List, Union
+from typing import Any, Dict, List, Tuple, Union
 
 from pyrogram import Client
 
 from .. import glovar
 from .etc import code, code_block, lang, thread
-from .file import crypt_file, data_to_file, delete_file, get_new_path
+from .file import bundle_to_file, compress_file, crypt_file, data_to_file, delete_file, get_new_path
 from .telegram import send_document, send_message
 
 # Enable logging
@@ -57,7 +57,7 @@ def exchange_to_hide(client: Client) -> bool:
 
 
 def format_data(sender: str, receivers: List[str], action: str, action_type: str,
-                data: Union[bool, dict, int, str] = None) -> str:
+                data: Union[bool, dict, int, str] = None, version: dict = None, compression: str = "") -> str:
     # See https://scp-079.org/exchange/
     text = ""
     try:
@@ -68,6 +68,16 @@ def format_data(sender: str, receivers: List[str], action: str, action_type: str
             "type": action_type,
             "data": data
         }
+
+        # Receivers not knowing the extra keys ignore them, the formats this bot reads are always told
+        data["accept"] = ["bundle", "delta", "lzma", "zlib"]
+
+        if compression:
+            data["compression"] = compression
+
+        if version is not None:
+            data["version"] = version
+
         text = code_block(dumps(data, indent=4))
     except Exception as e:
         logger.warning(f"Format data error: {e}", exc_info=True)
@@ -75,13 +85,40 @@ def format_data(sender: str, receivers: List[str], action: str, action_type: str
     return text
 
 
+def get_compression(receivers: List[str]) -> str:
+    # Get the compression method to use, empty if one of the receivers does not read it
+    if glovar.compression == "none" or not is_accepted(receivers, glovar.compression):
+        return ""
+
+    return glovar.compression
+
+
+def get_regex_entry(word_type: str) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Union[float, int]]]]:
+    # Get the bundle entry of a word type's whole rule set, it starts a new base version
+    _, version, data = glovar.rules.share(word_type, glovar.delta_limit, True)
+    entry = {
+        "name": f"{word_type}_words",
+        "type": "update",
+        "to": glovar.receivers[word_type],
+        "version": version
+    }
+
+    return entry, data
+
+
+def is_accepted(receivers: List[str], accept: str) -> bool:
+    # Check if all receivers read the format
+    return all(accept in glovar.accepts.get(receiver, set()) for receiver in receivers)
+
+
 def share_data(client: Client, receivers: List[str], action: str, action_type: str,
-               data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
+               data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True,
+               version: dict = None) -> bool:
     # Use this function to share data in the channel
     try:
         thread(
             target=share_data_thread,
-            args=(client, receivers, action, action_type, data, file, encrypt)
+            args=(client, receivers, action, action_type, data, file, encrypt, version)
         )
 
         return True
@@ -92,7 +129,8 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
 
 
 def share_data_thread(client: Client, receivers: List[str], action: str, action_type: str,
-                      data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
+                      data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True,
+                      version: dict = None) -> bool:
     # Share data thread
     try:
         if glovar.sender in receivers:
@@ -107,18 +145,34 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
             channel_id = glovar.exchange_channel_id
 
         if file:
+            compression = encrypt and get_compression(receivers)
+            file_compressed = file
+
+            # Compress the file before the encryption, encrypted bytes do not compress
+            if compression:
+                file_compressed = get_new_path()
+
+                # The original file is sent without the compression key if the compression fails
+                if not compress_file("compress", compression, file, file_compressed,
+                                     data if isinstance(data, str) else f"{action}_{action_type}"):
+                    thread(delete_file, (file_compressed,))
+                    compression = ""
+                    file_compressed = file
+
             text = format_data(
                 sender=glovar.sender,
                 receivers=receivers,
                 action=action,
                 action_type=action_type,
-                data=data
+                data=data,
+                version=version,
+                compression=compression
             )
 
             if encrypt:
                 # Encrypt the file, save to the tmp directory
                 file_path = get_new_path()
-                crypt_file("encrypt", file, file_path)
+                crypt_file("encrypt", file_compressed, file_path)
             else:
                 # Send directly
                 file_path = file
@@ -127,15 +181,17 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
 
             # Delete the tmp file
             if result:
-                for f in {file, file_path}:
-                    f.startswith("tmp/") and thread(delete_file, (f,))
+                for f in {file, file_compressed, file_path}:
+                    if f.startswith("tmp/"):
+                        thread(delete_file, (f,))
         else:
             text = format_data(
                 sender=glovar.sender,
                 receivers=receivers,
                 action=action,
                 action_type=action_type,
-                data=data
+                data=data,
+                version=version
             )
             result = send_message(client, channel_id, text)
 
@@ -143,7 +199,7 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
         if result is False and not glovar.should_hide:
             # Use hide channel instead
             exchange_to_hide(client)
-            thread(share_data, (client, receivers, action, action_type, data, file, encrypt))
+            thread(share_data, (client, receivers, action, action_type, data, file, encrypt, version))
 
         return True
     except Exception as e:
@@ -152,17 +208,117 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
     return False
 
 
-def share_regex_update(client: Client, word_type: str) -> bool:
-    # Use this function to share regex update to other bots
+def share_regex_bundle(client: Client, word_types: List[str]) -> bool:
+    # Use this function to share the whole rule sets of many word types in one file
     try:
-        file = data_to_file(eval(f"glovar.{word_type}_words"))
+        word_types = [word_type for word_type in word_types if glovar.receivers[word_type]]
+        receivers = sorted(set().union(*(glovar.receivers[word_type] for word_type in word_types)))
+
+        # Bots reading no bundle get one file per word type
+        if not is_accepted(receivers, "bundle"):
+            for word_type in word_types:
+                thread(share_regex_update, (client, word_type))
+
+            return True
+
+        file = bundle_to_file(get_regex_entry(word_type) for word_type in word_types)
+        share_data(
+            client=client,
+            receivers=receivers,
+            action="regex",
+            action_type="bundle",
+            data=[f"{word_type}_words" for word_type in word_types],
+            file=file
+        )
+
+        return True
+    except Exception as e:
+        logger.warning(f"Share regex bundle error: {e}", exc_info=True)
+
+    return False
+
+
+def share_regex_delta(client: Client, word_type: str) -> bool:
+    # Use this function to share the changes of the rules to other bots
+    try:
+        # The bots not reading deltas get the whole rule set instead
+        if glovar.rules.deltas[word_type] and not is_accepted(glovar.receivers[word_type], "delta"):
+            return share_regex_update(client, word_type)
+
+        action_type, version, data = glovar.rules.share(word_type, glovar.delta_limit)
+
+        if not action_type:
+            return True
+
+        file = data_to_file(data)
         share_data(
             client=client,
             receivers=glovar.receivers[word_type],
             action="regex",
+            action_type=action_type,
+            data=f"{word_type}_words",
+            file=file,
+            version=version
+        )
+
+        return True
+    except Exception as e:
+        logger.warning(f"Share regex delta error: {e}", exc_info=True)
+
+    return False
+
+
+def share_regex_sync(client: Client, word_type: str, receiver: str, version: dict) -> bool:
+    # Use this function to share what a bot at the version misses
+    try:
+        # Share the changes not shared yet first, so the answer brings the bot to the latest version
+        share_regex_delta(client, word_type)
+        action_type, version, data = glovar.rules.sync(word_type, version)
+
+        if not action_type:
+            return True
+
+        if action_type == "delta" and not is_accepted([receiver], "delta"):
+            return share_regex_update(client, word_type, [receiver])
+
+        file = data_to_file(data)
+        share_data(
+            client=client,
+            receivers=[receiver],
+            action="regex",
+            action_type=action_type,
+            data=f"{word_type}_words",
+            file=file,
+            version=version
+        )
+
+        return True
+    except Exception as e:
+        logger.warning(f"Share regex sync error: {e}", exc_info=True)
+
+    return False
+
+
+def share_regex_update(client: Client, word_type: str, receivers: List[str] = None) -> bool:
+    # Use this function to share regex update to other bots
+    try:
+        # A requested rule set keeps the current version, the other receivers' delta chains go on
+        if receivers:
+            share_regex_delta(client, word_type)
+            version, data = glovar.rules.request(word_type)
+        else:
+            _, version, data = glovar.rules.share(word_type, glovar.delta_limit, True)
+            receivers = glovar.receivers[word_type]
+
+        file = data_to_file(data)
+        share_data(
+            client=client,
+            receivers=receivers,
+            action="regex",
             action_type="update",
             data=f"{word_type}_words",
-            file=file
+            file=file,
+            version=version
         )
 
         return True
@@ -0,0 +1,255 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import pickle
+import sqlite3
+from os.path import dirname, join
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from .journal import Journal
+
+# This module must not import glovar, glovar imports it
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Fields of the rules table, in the order of the statistics
+fields = ("time", "average", "today", "total", "temp", "who")
+
+schema = """
+CREATE TABLE IF NOT EXISTS rules (
+    type TEXT NOT NULL,
+    word TEXT NOT NULL,
+    time INTEGER NOT NULL DEFAULT 0,
+    average REAL NOT NULL DEFAULT 0,
+    today INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    temp INTEGER NOT NULL DEFAULT 0,
+    who INTEGER NOT NULL DEFAULT 0,
+    samples BLOB,
+    PRIMARY KEY (type, word)
+);
+CREATE INDEX IF NOT EXISTS rules_word ON rules (word);
+DROP INDEX IF EXISTS rules_average;
+DROP INDEX IF EXISTS rules_order;
+CREATE INDEX IF NOT EXISTS rules_page ON rules (type, average, word);
+CREATE TABLE IF NOT EXISTS comments (
+    type TEXT PRIMARY KEY,
+    comment TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    data BLOB
+);
+"""
+
+# The samples of a rule are only replaced by its own entries
+upsert = (f"INSERT INTO rules (type, word, {', '.join(fields)}, samples) VALUES ({', '.join('?' * (len(fields) + 3))}) "
+          f"ON CONFLICT (type, word) DO UPDATE SET {', '.join(f'{f} = excluded.{f}' for f in fields)}")
+
+
+def get_row(word_type: str, word: str, status: Dict[str, Union[float, int]]) -> tuple:
+    # Get the row of a rule
+    samples = status.get("samples")
+
+    return ((word_type, word) + tuple(status.get(field, 0) for field in fields)
+            + (pickle.dumps(samples, protocol=pickle.HIGHEST_PROTOCOL) if samples else None,))
+
+
+class Database:
+    # SQLite storage of the rules, their statistics, comments and other data files
+    def __init__(self, path: str, word_types: Iterable[str]):
+        self.lock = Lock()
+        self.path = path
+        self.word_types = set(word_types)
+
+        # Changes waiting for the next commit, written in one transaction
+        self.pending: List[Tuple[str, tuple]] = []
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(schema)
+
+        # Databases created before the samples were stored with the rules
+        if "samples" not in {row[1] for row in self.connection.execute("PRAGMA table_info(rules)")}:
+            self.connection.execute("ALTER TABLE rules ADD COLUMN samples BLOB")
+
+    def __contains__(self, name: str) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM files WHERE name = ?", (name,)).fetchone() is not None
+
+    def append(self, word_type: str, entry: tuple) -> None:
+        # Add a change to the next commit
+        with self.lock:
+            self.pending.append((word_type, entry))
+
+    def commit(self) -> bool:
+        # Write the pending changes in one transaction
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+
+            if not pending:
+                return True
+
+            try:
+                self.connection.execute("BEGIN")
+
+                for word_type, entry in pending:
+                    self.execute(word_type, entry)
+
+                self.connection.execute("COMMIT")
+
+                return True
+            except Exception as e:
+                logger.error(f"Commit error: {e}", exc_info=True)
+
+                if self.connection.in_transaction:
+                    self.connection.execute("ROLLBACK")
+
+                self.pending = pending + self.pending
+
+        return False
+
+    def count(self, word_type: str) -> int:
+        # Get the number of pending changes of a word type
+        with self.lock:
+            return sum(1 for t, _ in self.pending if t == word_type)
+
+    def execute(self, word_type: str, entry: tuple) -> None:
+        # Write a change, inside the commit's transaction
+        action = entry[0]
+
+        if action == "add":
+            _, word, status = entry
+            self.connection.execute(upsert, get_row(word_type, word, status))
+        elif action == "remove":
+            _, word = entry
+            self.connection.execute("DELETE FROM rules WHERE type = ? AND word = ?", (word_type, word))
+        elif action == "update":
+            _, statuses = entry
+            self.connection.executemany(
+                f"UPDATE rules SET {', '.join(f'{f} = ?' for f in fields)} WHERE type = ? AND word = ?",
+                [tuple(s.get(f, 0) for f in fields) + (word_type, w) for w, s in statuses.items()]
+            )
+        elif action == "fill":
+            _, status = entry
+            self.connection.execute(f"UPDATE rules SET {', '.join(f'{f} = ?' for f in fields)} WHERE type = ?",
+                                    tuple(status.get(f, 0) for f in fields) + (word_type,))
+        elif action == "reset":
+            self.connection.execute("UPDATE rules SET temp = CASE WHEN today = 0 THEN temp + 1 ELSE 0 END, today = 0 "
+                                    "WHERE type = ?", (word_type,))
+        elif action == "samples":
+            _, samples = entry
+            self.connection.executemany(
+                "UPDATE rules SET samples = ? WHERE type = ? AND word = ?",
+                [(pickle.dumps(s, protocol=pickle.HIGHEST_PROTOCOL), word_type, w) for w, s in samples.items()]
+            )
+        elif action == "set":
+            _, name, data = entry
+            self.write(name, data)
+
+    def get(self, name: str) -> Any:
+        # Get the data of a file
+        with self.lock:
+            if name.endswith("_words") and name[:-6] in self.word_types:
+                rows = self.connection.execute(f"SELECT word, {', '.join(fields)}, samples FROM rules "
+                                               f"WHERE type = ? ORDER BY rowid", (name[:-6],))
+                result = {}
+
+                for row in rows:
+                    result[row[0]] = dict(zip(fields, row[1:-1]))
+
+                    if row[-1] is not None:
+                        result[row[0]]["samples"] = pickle.loads(row[-1])
+
+                return result
+
+            if name == "comments":
+                return dict(self.connection.execute("SELECT type, comment FROM comments"))
+
+            row = self.connection.execute("SELECT data FROM files WHERE name = ?", (name,)).fetchone()
+
+            return pickle.loads(row[0]) if row and row[0] is not None else None
+
+    def page(self, word_type: str, offset: int, limit: int, desc: bool) -> List[str]:
+        # Get a page of the rules ordered by their average usage, then by themselves, the index is read in either way
+        order = "DESC" if desc else "ASC"
+
+        with self.lock:
+            rows = self.connection.execute(f"SELECT word FROM rules WHERE type = ? "
+                                           f"ORDER BY average {order}, word {order} LIMIT ? OFFSET ?",
+                                           (word_type, limit, offset))
+
+            return [row[0] for row in rows]
+
+    def set(self, name: str, data: Any) -> None:
+        # Replace the data of a file in the next commit
+        self.append("", ("set", name, data))
+
+    def table(self, word_type: str) -> "Table":
+        # Get the journal of a word type
+        return Table(self, word_type)
+
+    def write(self, name: str, data: Any) -> None:
+        # Replace the data of a file, inside the commit's transaction
+        if name.endswith("_words") and name[:-6] in self.word_types:
+            word_type = name[:-6]
+            self.connection.execute("DELETE FROM rules WHERE type = ?", (word_type,))
+            self.connection.executemany(upsert, [get_row(word_type, w, s) for w, s in data.items()])
+            data = None
+        elif name == "comments":
+            self.connection.execute("DELETE FROM comments")
+            self.connection.executemany("INSERT INTO comments (type, comment) VALUES (?, ?)", data.items())
+            data = None
+        else:
+            data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.connection.execute("INSERT OR REPLACE INTO files (name, data) VALUES (?, ?)", (name, data))
+
+
+class Table:
+    # Journal of a word type kept in the database, the changes are written by the next commit
+    def __init__(self, database: Database, word_type: str):
+        self.database = database
+        self.word_type = word_type
+        self.saving = Lock()
+
+    def __len__(self) -> int:
+        return self.database.count(self.word_type)
+
+    def append(self, *entry) -> None:
+        # Add a change to the next commit
+        self.database.append(self.word_type, entry)
+
+    def replay(self, previous: bool = False) -> Iterator[tuple]:
+        # The database is always up to date, only the journal files left by the pickle backend are moved into it
+        for entry in Journal(join(dirname(self.database.path), f"{self.word_type}_words")).replay(previous):
+            self.append(*entry)
+            yield entry
+
+    def rotate(self) -> int:
+        # Nothing to rotate, the commit writes the changes
+        return 0
+
+    def prune(self, segment: int) -> None:
+        # Nothing to prune, the commit writes the changes
+        pass
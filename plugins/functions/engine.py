@@ -0,0 +1,188 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from typing import Dict, Iterator, List, Pattern, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+    from re._compiler import _EXTRA_CASES as extra_cases
+except ImportError:
+    import sre_constants
+    import sre_parse
+    from sre_compile import _ignorecase_fixes as extra_cases
+
+# This module must not import glovar, glovar imports it
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Flags used by every rule
+flags = re.I | re.M | re.S
+
+# Characters that match each other under re.I but have different lowercases
+fold_before: Dict[int, str] = {0x130: "i"}
+fold_after: Dict[int, str] = {i: chr(min((i,) + js)) for i, js in extra_cases.items()}
+
+
+def fold(text: str) -> str:
+    # Fold the text, so literals can be found case insensitively
+    return text.translate(fold_before).lower().translate(fold_after)
+
+
+def get_nodes(word: str) -> Iterator[Tuple[object, object]]:
+    # Walk through the parsed tree of a rule
+    stack = [sre_parse.parse(word, flags)]
+
+    while stack:
+        for op, av in stack.pop():
+            yield op, av
+
+            if isinstance(av, sre_parse.SubPattern):
+                stack.append(av)
+            elif isinstance(av, (list, tuple)):
+                for item in av:
+                    if isinstance(item, sre_parse.SubPattern):
+                        stack.append(item)
+                    elif isinstance(item, (list, tuple)):
+                        stack.extend(i for i in item if isinstance(i, sre_parse.SubPattern))
+
+
+def is_combinable(word: str, pattern: Pattern) -> bool:
+    # Check if the rule can share a combined pattern with other rules
+    try:
+        # Inline global flags would leak into other rules, named groups would clash
+        if pattern.flags != re.compile("", flags).flags or pattern.groupindex:
+            return False
+
+        # Numbered references would point to other groups after combining
+        if any(op in {sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS} for op, _ in get_nodes(word)):
+            return False
+
+        re.compile(f"(?P<w0>{word})|(?P<w1>{word})", flags)
+
+        return True
+    except Exception as e:
+        logger.info(f"Is combinable error: {e}")
+
+    return False
+
+
+class Chunk:
+    # Up to "size" rules of a word type compiled as one alternation
+    __slots__ = ("words", "pattern")
+
+    def __init__(self, words: Tuple[str, ...], combined: bool):
+        self.words = words
+
+        # Each rule is a named group, the group that fired tells which rule hit
+        if combined:
+            self.pattern = re.compile("|".join(f"(?P<w{i}>{w})" for i, w in enumerate(words)), flags)
+        else:
+            self.pattern = None
+
+    def fired(self, text: str) -> int:
+        # Get the position of the rule that fired on the text, -1 if none fired
+        match = self.pattern.search(text)
+
+        if not match:
+            return -1
+
+        return int(match.lastgroup[1:])
+
+
+class Engine:
+    # Combined patterns of a word type, rules keep the order of the words dict
+    def __init__(self, size: int):
+        self.size = max(size, 1)
+        self.chunks: List[Chunk] = []
+        self.where: Dict[str, Chunk] = {}
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def add(self, word: str, pattern: Pattern) -> None:
+        # Add a rule to the last chunk, only that chunk is rebuilt
+        if word in self.where:
+            return
+
+        chunks = list(self.chunks)
+        combined = is_combinable(word, pattern)
+        last = chunks and chunks[-1]
+
+        if combined and last and last.pattern is not None and len(last.words) < self.size:
+            chunk = Chunk(last.words + (word,), True)
+            chunks[-1] = chunk
+        else:
+            chunk = Chunk((word,), combined)
+            chunks.append(chunk)
+
+        self.chunks = chunks
+
+        for w in chunk.words:
+            self.where[w] = chunk
+
+    def remove(self, word: str) -> None:
+        # Remove a rule, only the chunk it belongs to is rebuilt
+        old = self.where.pop(word, None)
+
+        if old is None:
+            return
+
+        chunks = list(self.chunks)
+        index = next(i for i, c in enumerate(chunks) if c is old)
+        i = old.words.index(word)
+        words = old.words[:i] + old.words[i + 1:]
+
+        if words:
+            chunk = Chunk(words, old.pattern is not None)
+            chunks[index] = chunk
+
+            for w in words:
+                self.where[w] = chunk
+        else:
+            chunks.pop(index)
+
+        self.chunks = chunks
+
+
+class Normalized:
+    # Variants of a text computed once, shared by every word type and rule
+    __slots__ = ("origin", "text", "stripped", "again", "texts", "folded_texts")
+
+    def __init__(self, text: str):
+        self.origin = text
+        self.text = re.sub(r"\s{2,}", " ", text)
+        self.stripped = re.sub(r"\s", "", self.text)
+        self.texts = (self.text,) if self.stripped == self.text else (self.text, self.stripped)
+        self.folded_texts = None
+
+        # The stripped text only counts when the text has spaces and no rule hits the text
+        self.again = " " in self.text
+
+    def __bool__(self) -> bool:
+        return bool(self.origin)
+
+    @property
+    def folded(self) -> Tuple[str, ...]:
+        # Folded variants for the prefilter
+        if self.folded_texts is None:
+            self.folded_texts = tuple(fold(t) for t in self.texts)
+
+        return self.folded_texts
@@ -28,7 +28,6 @@ from typing import Any, Callable, List, Optional, Union
 from unicodedata import normalize
 
 from cryptography.fernet import Fernet
-from opencc import convert
 from pyrogram import InlineKeyboardButton, InlineKeyboardMarkup, Message, User
 from pyrogram.errors import FloodWait
 
@@ -508,17 +507,28 @@ def t2t(text: str, normal: bool, printable: bool, simplified: bool = False) -> s
         if not text:
             return ""
 
-        if normal:
-            for special in ["spc", "spe"]:
-                text = "".join(eval(f"glovar.{special}_dict").get(t, t) for t in text)
+        # Without the normalization or the conversion, the work is cheaper than a cache lookup
+        if not normal and not (simplified and glovar.zh_cn):
+            return text.translate(glovar.printable_table) if printable else text
+
+        # Get the cached result
+        key = (text, normal, printable, simplified)
+        generation = glovar.t2t_cache.generation
+        result = glovar.t2t_cache.get(key)
 
-            text = normalize("NFKC", text)
+        if result is not None:
+            return result
+
+        if normal:
+            text = normalize("NFKC", text.translate(glovar.t2t_table.table))
 
         if printable:
-            text = "".join(t for t in text if t.isprintable() or t in {"\n", "\r", "\t"})
+            text = text.translate(glovar.printable_table)
 
         if (normal or simplified) and glovar.zh_cn:
-            text = convert(text, config="t2s.json")
+            text = glovar.converter.convert(text)
+
+        glovar.t2t_cache.set(key, text, generation)
     except Exception as e:
         logger.warning(f"T2T error: {e}", exc_info=True)
 
@@ -17,23 +17,98 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from os import remove
-from os.path import exists
-from pickle import dump
+import lzma
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from os import O_RDONLY, close, fsync, link, open as os_open, remove, replace
+from os.path import exists, getsize
+from pickle import HIGHEST_PROTOCOL, dump, dumps, load
 from shutil import copyfile
-from typing import Any
+from time import sleep, time
+from typing import Any, Dict, Iterable, Iterator, Tuple
 
 from pyrogram import Client
 from pyAesCrypt import decryptFile, encryptFile
 
 from .. import glovar
-from .etc import random_str, thread
+from .etc import random_str
+from .journal import Journal
 from .telegram import download_media
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
 
+def bundle_to_file(entries: Iterable[Tuple[Dict[str, Any], Any]]) -> str:
+    # Save many data to one bundle file in tmp directory, each entry is written as soon as it is produced
+    try:
+        file_path = get_new_path()
+        manifest = []
+
+        with open(file_path, "wb") as f:
+            dump({"bundle": 1}, f)
+
+            for entry, data in entries:
+                dump(entry, f)
+                dump(data, f)
+                manifest.append(entry)
+
+            # The manifest closes the bundle, a reader stops at it
+            dump({"manifest": manifest}, f)
+
+        return file_path
+    except Exception as e:
+        logger.warning(f"Bundle to file error: {e}", exc_info=True)
+
+    return ""
+
+
+def compress_file(operation: str, method: str, file_in: str, file_out: str, name: str = "") -> bool:
+    # Compress or decompress a file, record the ratio and the time of the name
+    try:
+        if not file_in or not file_out:
+            return True
+
+        buffer = 64 * 1024
+        start = time()
+
+        if method == "lzma":
+            compressor = lzma.LZMACompressor() if operation == "compress" else lzma.LZMADecompressor()
+        else:
+            compressor = zlib.compressobj(9) if operation == "compress" else zlib.decompressobj()
+
+        process = compressor.compress if operation == "compress" else compressor.decompress
+
+        with open(file_in, "rb") as f_in, open(file_out, "wb") as f_out:
+            for chunk in iter(lambda: f_in.read(buffer), b""):
+                f_out.write(process(chunk))
+
+            if hasattr(compressor, "flush"):
+                f_out.write(compressor.flush())
+
+        # A truncated stream decompresses without an error, but it does not reach its end
+        if operation == "decompress" and not compressor.eof:
+            logger.warning(f"Compress file error: {file_in} is truncated")
+            return False
+
+        if not name:
+            return True
+
+        count = glovar.compress_count.setdefault(name, {"size": 0, "compressed": 0, "compress": 0.0, "decompress": 0.0})
+        count[operation] += time() - start
+
+        if operation == "compress":
+            count["size"] += getsize(file_in)
+            count["compressed"] += getsize(file_out)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Compress file error: {e}", exc_info=True)
+
+    return False
+
+
 def crypt_file(operation: str, file_in: str, file_out: str) -> bool:
     # Encrypt or decrypt a file
     try:
@@ -82,6 +157,107 @@ def delete_file(path: str) -> bool:
     return False
 
 
+def flush() -> bool:
+    # Write every file in the save queue once
+    try:
+        with glovar.locks["save"]:
+            with glovar.locks["queue"]:
+                files = glovar.save_queue
+                glovar.save_queue = {}
+
+            if not files:
+                return True
+
+            start = time()
+
+            for file in files:
+                save_thread(file)
+
+            glovar.save_count["flush"] += 1
+            glovar.save_count["latency"] = time() - start
+            glovar.save_count["wait"] = time() - min(files.values())
+
+        return True
+    except Exception as e:
+        logger.warning(f"Flush error: {e}", exc_info=True)
+
+    return False
+
+
+def fsync_dir(path: str) -> bool:
+    # Make the renames in a directory durable
+    try:
+        fd = os_open(path, O_RDONLY)
+
+        try:
+            fsync(fd)
+        finally:
+            close(fd)
+
+        return True
+    except Exception as e:
+        logger.info(f"Fsync dir error: {e}")
+
+    return False
+
+
+def get_backup_entries(full: bool, hashes: Dict[str, str]) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    # Get the bundle entries of the data files BACKUP has not acknowledged, fill the hashes of the files BACKUP keeps
+    for file in glovar.file_list:
+        if file == "backups":
+            continue
+
+        word_type = get_word_type(file)
+        data = None
+
+        # A rules file is hashed without exporting it, the hash is taken before the export,
+        # so a change made in between is sent again next time
+        if word_type:
+            hashes[file] = glovar.rules.checksum(word_type)
+        else:
+            data = get_data(file)
+            hashes[file] = blake2b(dumps(data, protocol=HIGHEST_PROTOCOL), digest_size=16).hexdigest() if data else ""
+
+        previous = glovar.backups.get("hashes", {}).get(file)
+
+        # An emptied file is sent empty once, so BACKUP does not keep the old data
+        if not hashes[file] and not previous:
+            if previous is None:
+                hashes.pop(file)
+
+            continue
+
+        if not full and previous == hashes[file]:
+            continue
+
+        yield {"name": file, "type": "data", "hash": hashes[file]}, get_data(file) if data is None else data
+
+
+def get_bundle(path: str) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    # Read the entries of a bundle file one at a time
+    with open(path, "rb") as f:
+        if load(f).get("bundle") != 1:
+            return
+
+        while True:
+            entry = load(f)
+
+            if "manifest" in entry:
+                return
+
+            yield entry, load(f)
+
+
+def get_data(file: str) -> Any:
+    # Get the global variable saved as the file
+    word_type = get_word_type(file)
+
+    if word_type:
+        return glovar.rules.export(word_type)
+
+    return getattr(glovar, file)
+
+
 def get_downloaded_path(client: Client, file_id: str, file_ref: str) -> str:
     # Download file, get it's path on local machine
     final_path = ""
@@ -113,10 +289,116 @@ def get_new_path(extension: str = "") -> str:
     return result
 
 
+def get_word_type(file: str) -> str:
+    # Get the word type of a rules file, empty for other files
+    word_type = file[:-6] if file.endswith("_words") else ""
+
+    return word_type if word_type in glovar.rules else ""
+
+
+def load_data() -> bool:
+    # Load the data files and fill the stores, then let the handlers run
+    try:
+        start = time()
+
+        # Reading the files overlaps with each other and with connecting the client
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            data = dict(zip(glovar.file_list, executor.map(load_file, glovar.file_list)))
+
+        glovar.startup_times["files"] = time() - start
+
+        for file in ["ask_words", "backups", "comments"]:
+            setattr(glovar, file, data.pop(file))
+
+        # Each file is the latest snapshot, the changes made after it are replayed from the journal
+        start = time()
+
+        for word_type in glovar.regex:
+            glovar.rules.load(word_type, data.pop(f"{word_type}_words"))
+            glovar.rules.replay(word_type, f"{word_type}_words" in glovar.fallbacks)
+
+        # The samples were kept in a file of their own, the rules holding none take theirs from it
+        if (glovar.database and "samples" in glovar.database) or exists("data/samples"):
+            samples = load_file("samples")
+
+            for word_type in glovar.regex:
+                rules = glovar.rules[word_type]
+                missing = {w: s for w, s in samples.get(word_type, {}).items() if w in rules and w not in rules.samples}
+
+                if missing:
+                    glovar.rules.set_samples(word_type, missing)
+
+        # The journal files left by the pickle backend are in the database now
+        if glovar.database and glovar.database.commit():
+            for word_type in glovar.regex:
+                journal = Journal(f"data/{word_type}_words")
+                journal.clear()
+
+        glovar.startup_times["rules"] = time() - start
+
+        # Special characters of the loaded rules
+        start = time()
+
+        for special in ["spc", "spe"]:
+            for rule in glovar.rules[special]:
+                glovar.t2t_table.add(special, rule)
+
+        glovar.startup_times["tables"] = time() - start
+
+        glovar.loaded = True
+
+        return True
+    except Exception as e:
+        logger.critical(f"Load data error: {e}", exc_info=True)
+    finally:
+        glovar.ready.set()
+
+    return False
+
+
+def load_file(file: str) -> Any:
+    # Load a data file, the previous file is read if the file is broken
+    start = time()
+    result = {}
+    try:
+        if glovar.database and file in glovar.database:
+            return glovar.database.get(file)
+
+        if exists(f"data/{file}") or exists(f"data/.{file}"):
+            try:
+                with open(f"data/{file}", "rb") as f:
+                    result = load(f)
+            except Exception as e:
+                logger.error(f"Load data {file} error: {e}", exc_info=True)
+
+                with open(f"data/.{file}", "rb") as f:
+                    result = load(f)
+
+                # The changes made since the previous file are replayed from the journal kept for it
+                glovar.fallbacks.add(file)
+                logger.critical(f"Data {file} is broken, the previous file data/.{file} is loaded instead")
+        elif not glovar.database:
+            write_data(file, result)
+
+        # The pickle files are moved into the database
+        if glovar.database:
+            glovar.database.set(file, result)
+    except Exception as e:
+        logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
+        raise SystemExit("[DATA CORRUPTION]")
+    finally:
+        glovar.startup_times[file] = time() - start
+
+    return result
+
+
 def save(file: str) -> bool:
-    # Save a global variable to a file
+    # Save a global variable to a file, requests made within the save window are merged
     try:
-        thread(save_thread, (file,))
+        with glovar.locks["queue"]:
+            glovar.save_queue.setdefault(file, time())
+
+        glovar.save_event.set()
 
         return True
     except Exception as e:
@@ -125,19 +407,94 @@ def save(file: str) -> bool:
     return False
 
 
+def save_rules(word_type: str) -> bool:
+    # Save the rules of a word type, the changes are already in the journal, so only write a long journal's snapshot
+    try:
+        # The database commits the changes in every flush
+        if not glovar.database and len(glovar.rules.journals[word_type]) < glovar.journal_size:
+            return True
+
+        return save(f"{word_type}_words")
+    except Exception as e:
+        logger.warning(f"Save rules error: {e}", exc_info=True)
+
+    return False
+
+
 def save_thread(file: str) -> bool:
     # Save thread
     try:
         if not glovar:
             return True
 
-        with open(f"data/.{file}", "wb") as f:
-            dump(eval(f"glovar.{file}"), f)
+        word_type = get_word_type(file)
+
+        # The rules are already in the database's pending changes
+        if glovar.database:
+            if not word_type:
+                glovar.database.set(file, get_data(file))
+
+            return glovar.database.commit()
+
+        if not word_type:
+            return write_data(file, get_data(file))
+
+        # Changes go on being appended to the journal while the snapshot is written
+        journal = glovar.rules.journals[word_type]
+
+        with journal.saving:
+            data, segment = glovar.rules.snapshot(word_type)
 
-        copyfile(f"data/.{file}", f"data/{file}")
+            if write_data(file, data):
+                journal.prune(segment)
 
         return True
     except Exception as e:
         logger.error(f"Save thread error: {e}", exc_info=True)
 
     return False
+
+
+def save_worker() -> bool:
+    # Flush the save queue after the save window, the only thread that writes the queued files
+    while True:
+        try:
+            glovar.save_event.wait()
+            sleep(glovar.save_window)
+            glovar.save_event.clear()
+            flush()
+        except Exception as e:
+            logger.warning(f"Save worker error: {e}", exc_info=True)
+
+    return False
+
+
+def write_data(file: str, data: Any) -> bool:
+    # Write the data to a file in data directory, the previous file is kept as data/.{file}
+    try:
+        path = f"data/{file}"
+        temp_path = f"data/.{file}.tmp"
+
+        with open(temp_path, "wb") as f:
+            dump(data, f)
+            f.flush()
+            fsync(f.fileno())
+
+        # Readers see either the previous file or the new one, never a partly written file
+        if exists(path):
+            if exists(f"data/.{file}"):
+                remove(f"data/.{file}")
+
+            try:
+                link(path, f"data/.{file}")
+            except OSError:
+                copyfile(path, f"data/.{file}")
+
+        replace(temp_path, path)
+        fsync_dir("data")
+
+        return True
+    except Exception as e:
+        logger.error(f"Write data error: {e}", exc_info=True)
+
+    return False
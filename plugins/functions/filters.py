@@ -18,18 +18,40 @@
 
 import logging
 import re
-from typing import Match, Optional, Union
+import string
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, List, Match, Optional, Pattern, Set, Tuple, Union
+from zlib import crc32
 
 from pyrogram import CallbackQuery, Filters, Message
 from xeger import Xeger
 
 from .. import glovar
+from .engine import Engine, Normalized, fold
+from .inclusion import is_included
+from .prefilter import Prefilter, SampleIndex, get_literals, get_width
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
-# Xeger config
-xg = Xeger(limit=32)
+
+class Sampler(Xeger):
+    # Xeger picking from sorted alphabets, its own alphabets come from sets, so their order changes between processes,
+    # it replaces internals of xeger 0.3.5, the version pinned in requirements.txt
+    def __init__(self, limit: int = 10, seed: int = None):
+        super().__init__(limit=limit, seed=seed)
+        self._alphabets["nonword"] = "".join(sorted(set(string.printable).difference(string.ascii_letters
+                                                                                     + string.digits + "_")))
+
+    def _handle_in(self, value: list) -> str:
+        # Pick a character of a class, a negated class picks from the printable characters it does not hold
+        candidates = list(chain(*(self._handle_state(i) for i in value)))
+
+        if candidates[0] is False:
+            candidates = sorted(set(string.printable).difference(candidates[1:]))
+
+        return self.random_choice(candidates)
 
 
 def is_aio(_, __) -> bool:
@@ -162,80 +184,477 @@ regex_group = Filters.create(
 )
 
 
-def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = False) -> Optional[Match]:
-    # Check if the text hit the regex rules
+def add_rule(word_type: str, word: str, status: dict) -> bool:
+    # Add a rule to the store, with its samples, its compiled pattern and its place in the engine and the indexes
+    glovar.locks["engine"].acquire()
+    try:
+        glovar.rules.add(word_type, word, status)
+        fill_samples(word_type, [word])
+
+        if word_type in {"spc", "spe"} and glovar.t2t_table.add(word_type, word):
+            glovar.t2t_cache.clear()
+
+        pattern = compile_word(word_type, word)
+
+        if not pattern:
+            return False
+
+        rules = glovar.rules[word_type]
+
+        if rules.engine is not None:
+            rules.engine.add(word, pattern)
+
+        if rules.prefilter is not None:
+            rules.prefilter.add(word)
+
+        if rules.index is not None:
+            rules.index.add(word, get_samples(word_type, word))
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add rule error: {e}", exc_info=True)
+    finally:
+        glovar.locks["engine"].release()
+
+    return False
+
+
+def compile_word(word_type: str, word: str) -> Optional[Pattern]:
+    # Compile a rule and keep it in the registry of the word type
     result = None
     try:
-        if text:
-            if not again:
-                text = re.sub(r"\s{2,}", " ", text)
-            elif " " in text:
-                text = re.sub(r"\s", "", text)
-            else:
-                return None
+        result = re.compile(word, re.I | re.M | re.S)
+        glovar.rules[word_type].compiled[word] = result
+    except Exception as e:
+        logger.warning(f"Compile word error: {e}", exc_info=True)
+
+    return result
+
+
+def get_candidates(word_type: str, text: Normalized) -> Optional[Set[str]]:
+    # Get the rules that may hit any variant of the text, None means all rules
+    result = None
+    try:
+        if not glovar.prefilter:
+            return None
+
+        result = get_prefilter(word_type).candidates(*text.folded)
+    except Exception as e:
+        logger.warning(f"Get candidates error: {e}", exc_info=True)
+
+    return result
+
+
+def fill_samples(word_type: str, words: List[str] = None) -> bool:
+    # Generate the sample banks the rules do not have yet, and keep them in one journal entry
+    try:
+        rules = glovar.rules[word_type]
+        missing = {word: list(get_random_strings(word, glovar.sample_size)) for word in (words or rules)
+                   if word in rules and len(rules.samples.get(word) or []) != glovar.sample_size}
+
+        if missing:
+            glovar.rules.set_samples(word_type, missing)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Fill samples error: {e}", exc_info=True)
+
+    return False
+
+
+def get_engine(word_type: str) -> Optional[Engine]:
+    # Get the combined engine of the word type, build it on first use
+    rules = glovar.rules[word_type]
+    result = rules.engine
+
+    if result is not None:
+        return result
+
+    glovar.locks["engine"].acquire()
+    try:
+        result = rules.engine
+
+        if result is not None:
+            return result
+
+        result = Engine(glovar.combine_size)
+
+        for word in rules:
+            pattern = get_pattern(word_type, word)
+
+            if pattern:
+                result.add(word, pattern)
+
+        rules.engine = result
+    except Exception as e:
+        logger.warning(f"Get engine error: {e}", exc_info=True)
+    finally:
+        glovar.locks["engine"].release()
+
+    return result
+
+
+def get_index(word_type: str) -> Optional[SampleIndex]:
+    # Get the sample index of the word type, build it on first use
+    rules = glovar.rules[word_type]
+    result = rules.index
+
+    if result is not None:
+        return result
+
+    glovar.locks["engine"].acquire()
+    try:
+        result = rules.index
+
+        if result is not None:
+            return result
+
+        result = SampleIndex()
+        fill_samples(word_type)
+
+        for word in rules:
+            result.add(word, get_samples(word_type, word))
+
+        rules.index = result
+    except Exception as e:
+        logger.warning(f"Get index error: {e}", exc_info=True)
+    finally:
+        glovar.locks["engine"].release()
+
+    return result
+
+
+def get_pattern(word_type: str, word: str) -> Optional[Pattern]:
+    # Get the compiled pattern of a rule
+    result = None
+    try:
+        if not word_type:
+            return re.compile(word, re.I | re.M | re.S)
+
+        rules = glovar.rules[word_type]
+        result = rules.compiled.get(word)
+
+        if result:
+            glovar.compiled_count["hit"] += 1
+            return result
+
+        glovar.compiled_count["miss"] += 1
+
+        if word not in rules:
+            return re.compile(word, re.I | re.M | re.S)
+
+        result = compile_word(word_type, word)
+    except Exception as e:
+        logger.warning(f"Get pattern error: {e}", exc_info=True)
+
+    return result
+
+
+@lru_cache(maxsize=256)
+def get_random_strings(word: str, size: int) -> Tuple[str, ...]:
+    # Generate random strings matching the rule, the seed comes from the rule, so the result is reproducible
+    xg = Sampler(limit=32)
+    xg.seed(crc32(word.encode("utf-8")))
+
+    return tuple(xg.xeger(word) for _ in range(size))
+
+
+def get_samples(word_type: str, word: str) -> List[str]:
+    # Get the sample bank of a rule, generate it if the rule has none, fill_samples keeps the generated banks
+    result = []
+    try:
+        rules = glovar.rules[word_type] if word_type in glovar.rules else None
+        result = rules.samples.get(word) if rules is not None else None
+
+        if result and len(result) == glovar.sample_size:
+            return result
+
+        result = list(get_random_strings(word, glovar.sample_size))
+    except Exception as e:
+        logger.info(f"Get samples error: {e}")
+
+    return result or []
+
+
+def get_similar(word_type: str, word: str) -> List[str]:
+    # Get the rules of the word type that are similar to the word in strict mode
+    result = []
+    try:
+        words = list(glovar.rules[word_type])
+        samples = get_samples(word_type, word)
+
+        # Strict mode needs, for every pair of samples, the old rule to hit the new sample,
+        # or the new rule to hit the old sample, so the rules failing both are skipped,
+        # without samples of the new rule all rules are checked, the inclusion check needs none
+        index = get_index(word_type)
+        prefilter = get_prefilter(word_type)
+        containing = index.containing(get_literals(word), get_width(word))
+        candidates = set(words)
+
+        for sample in samples:
+            hitting = index.fits(prefilter.candidates(fold(sample)), len(sample))
+            candidates &= hitting | containing
+
+        result = [w for w in words if w in candidates and is_similar("strict", w, word, word_type)]
+
+        if not glovar.verify:
+            return result
+
+        # Run the full scan and report any disagreement
+        full = [w for w in words if is_similar("strict", w, word, word_type)]
+
+        if full != result:
+            logger.warning(f"Get similar disagreement in {word_type} for {word}: "
+                           f"missed {set(full) - set(result)}, extra {set(result) - set(full)}")
+            result = full
+    except Exception as e:
+        logger.warning(f"Get similar error: {e}", exc_info=True)
+
+    return result
+
+
+def get_words(word_type: str, candidates: Optional[Set[str]], text: Normalized, first: bool = True) -> List[str]:
+    # Get the rules worth running against the variants of the text, in order
+    result = []
+    try:
+        if glovar.combine:
+            for chunk in get_engine(word_type).chunks:
+                if candidates is not None and candidates.isdisjoint(chunk.words):
+                    continue
+
+                if chunk.pattern is None:
+                    result += chunk.words
+                    continue
+
+                fired = [chunk.fired(t) for t in text.texts]
+                last = max(fired)
+
+                if last < 0:
+                    continue
+
+                if not first:
+                    result += chunk.words
+                    continue
+
+                # The fired rule hits, so the rules after it can not be the first hit
+                result += chunk.words[:last + 1]
+
+                # Neither can the rules of the later chunks, once a rule hits the text itself
+                if fired[0] >= 0:
+                    break
         else:
+            result = list(glovar.rules[word_type])
+
+        if candidates is not None:
+            result = [w for w in result if w in candidates]
+    except Exception as e:
+        logger.warning(f"Get words error: {e}", exc_info=True)
+
+    return result
+
+
+def get_prefilter(word_type: str) -> Optional[Prefilter]:
+    # Get the prefilter of the word type, build it on first use
+    rules = glovar.rules[word_type]
+    result = rules.prefilter
+
+    if result is not None:
+        return result
+
+    glovar.locks["engine"].acquire()
+    try:
+        result = rules.prefilter
+
+        if result is not None:
+            return result
+
+        result = Prefilter()
+
+        for word in rules:
+            result.add(word)
+
+        rules.prefilter = result
+    except Exception as e:
+        logger.warning(f"Get prefilter error: {e}", exc_info=True)
+    finally:
+        glovar.locks["engine"].release()
+
+    return result
+
+
+def remove_rule(word_type: str, word: str) -> dict:
+    # Remove a rule from the store, with its compiled pattern and its place in the engine and the indexes
+    result = {}
+    glovar.locks["engine"].acquire()
+    try:
+        result = glovar.rules.remove(word_type, word)
+
+        if word_type in {"spc", "spe"} and glovar.t2t_table.remove(word_type, word):
+            glovar.t2t_cache.clear()
+
+        rules = glovar.rules[word_type]
+        rules.compiled.pop(word, None)
+
+        if rules.engine is not None:
+            rules.engine.remove(word)
+
+        if rules.prefilter is not None:
+            rules.prefilter.remove(word)
+
+        if rules.index is not None:
+            rules.index.remove(word)
+    except Exception as e:
+        logger.warning(f"Remove rule error: {e}", exc_info=True)
+    finally:
+        glovar.locks["engine"].release()
+
+    return result
+
+
+def is_regex_text(word_type: str, text: Union[str, Normalized], ocr: bool = False) -> Optional[Match]:
+    # Check if the text hit the regex rules
+    result = None
+    try:
+        if isinstance(text, str):
+            text = text and Normalized(text)
+
+        if not text:
             return None
 
-        words = list(eval(f"glovar.{word_type}_words"))
+        # Only rules whose required literals occur in the text may hit
+        candidates = get_candidates(word_type, text)
 
-        for word in words:
+        # Run both variants against each rule in one pass, OCR skips some rules, so the first hit is not known
+        for word in get_words(word_type, candidates, text, not ocr):
             if ocr and "(?# nocr)" in word:
                 continue
 
-            result = re.search(word, text, re.I | re.S | re.M)
+            pattern = get_pattern(word_type, word)
+
+            if not pattern:
+                continue
+
+            match = pattern.search(text.text)
 
             # Return
-            if result:
-                return result
+            if match:
+                return match
 
-        # Try again
-        return is_regex_text(word_type, text, ocr, True)
+            # Keep the first hit of the stripped text, in case no rule hits the text
+            if not result and text.again and len(text.texts) > 1:
+                result = pattern.search(text.stripped)
     except Exception as e:
         logger.warning(f"Is regex text error: {e}", exc_info=True)
 
     return result
 
 
-def is_similar(mode: str, a: str, b: str) -> bool:
-    # Get regex match result
+def is_similar(mode: str, a: str, b: Union[str, Normalized], word_type: str = "") -> bool:
+    # Get regex match result, the rule "a" belongs to the word type
     try:
         if mode == "find":
             if b not in a:
                 return False
 
         elif mode == "loose" or mode == "s":
-            if not (re.search(a, b, re.I | re.M | re.S)
-                    or re.search(b, a, re.I | re.M | re.S)
-                    or re.search(a, xg.xeger(b), re.I | re.M | re.S)
-                    or re.search(b, xg.xeger(a), re.I | re.M | re.S)):
+            pattern = get_pattern(word_type, a)
+            b_pattern = re.compile(b, re.I | re.M | re.S)
+
+            if not (pattern.search(b)
+                    or b_pattern.search(a)
+                    or any(pattern.search(s) for s in get_samples(word_type, b))
+                    or any(b_pattern.search(s) for s in get_samples(word_type, a))):
                 return False
 
         elif mode == "search":
-            if not (re.search(b, a, re.I | re.M | re.S)
-                    or re.search(b, xg.xeger(a), re.I | re.M | re.S)):
+            b_pattern = re.compile(b, re.I | re.M | re.S)
+
+            if not (b_pattern.search(a)
+                    or any(b_pattern.search(s) for s in get_samples(word_type, a))):
                 return False
 
         elif mode == "strict":
-            i = 0
+            # Compare the languages of regular rules directly
+            b_in_a = is_included(a, b)
+            a_in_b = is_included(b, a)
 
-            while i < 3:
-                if not (re.search(a, xg.xeger(b), re.I | re.M | re.S)
-                        or re.search(b, xg.xeger(a), re.I | re.M | re.S)):
-                    return False
+            if a_in_b or b_in_a:
+                return True
 
-                i += 1
+            if a_in_b is False and b_in_a is False:
+                return False
 
-        elif mode == "test":
-            b = re.sub(r"\s{2,}", " ", b)
+            # Fall back to the sample banks for the other rules
+            pattern = get_pattern(word_type, a)
+            b_pattern = re.compile(b, re.I | re.M | re.S)
+            a_samples = get_samples(word_type, a)
+            b_samples = get_samples(word_type, b)
 
-            if not re.search(a, b, re.I | re.M | re.S):
-                b = re.sub(r"\s", "", b)
+            if not a_samples or not b_samples:
+                return False
 
-                if not re.search(a, b, re.I | re.M | re.S):
+            for a_sample, b_sample in zip(a_samples, b_samples):
+                if not (pattern.search(b_sample) or b_pattern.search(a_sample)):
                     return False
 
+        elif mode == "test":
+            pattern = get_pattern(word_type, a)
+
+            if isinstance(b, str):
+                b = Normalized(b)
+
+            if not any(pattern.search(t) for t in b.texts):
+                return False
+
         return True
     except Exception as e:
         logger.warning(f"Is similar error: {e}", exc_info=True)
 
     return False
+
+
+def scan(text: Union[str, Normalized], types: List[str], mode: str = "first") -> Dict[str, List[str]]:
+    # Scan the text with rules of the types, get the first or all hit rules of each type
+    result = {}
+    try:
+        if isinstance(text, str):
+            text = text and Normalized(text)
+
+        if not text:
+            return {}
+
+        for word_type in types:
+            candidates = get_candidates(word_type, text)
+            hits = []
+            hit = False
+            first = ""
+
+            for word in get_words(word_type, candidates, text, mode == "first"):
+                pattern = get_pattern(word_type, word)
+
+                if not pattern:
+                    continue
+
+                if pattern.search(text.text):
+                    hits.append(word)
+                    hit = True
+
+                    if mode == "first":
+                        first = word
+                        break
+                elif len(text.texts) > 1 and pattern.search(text.stripped):
+                    hits.append(word)
+                    hit = hit or text.again
+                    first = first or (text.again and word) or ""
+
+            if not hit:
+                continue
+
+            if mode == "first":
+                result[word_type] = [first]
+            else:
+                result[word_type] = hits
+    except Exception as e:
+        logger.warning(f"Scan error: {e}", exc_info=True)
+
+    return result
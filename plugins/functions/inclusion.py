@@ -0,0 +1,368 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Pattern, Set, Tuple
+
+from .engine import flags, sre_constants, sre_parse
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Most NFA states of a rule, and most product states explored by one check
+limit_nfa = 2000
+limit_states = 20000
+
+# Largest bounded repeat expanded into states
+limit_repeat = 64
+
+# Characters standing for the code points that no rule mentions
+pool = "05\u0663azAZ_\u00e9\u00df\u4e2d \n\t\r\u3000\u00a0!.-#@/\x00\u200b\U0001f600kK\u212asS\u017fiI\u0130\u0131"
+
+# Character class escapes
+categories: Dict[object, str] = {
+    sre_constants.CATEGORY_DIGIT: r"\d",
+    sre_constants.CATEGORY_NOT_DIGIT: r"\D",
+    sre_constants.CATEGORY_SPACE: r"\s",
+    sre_constants.CATEGORY_NOT_SPACE: r"\S",
+    sre_constants.CATEGORY_WORD: r"\w",
+    sre_constants.CATEGORY_NOT_WORD: r"\W"
+}
+
+
+class Unsupported(Exception):
+    # The rule is not a regular expression in the strict sense
+    pass
+
+
+class Nfa:
+    # Thompson NFA of a rule, edges are labeled with single character patterns
+    __slots__ = ("atoms", "points", "signatures", "edges", "epsilons", "start", "end", "pattern", "sample")
+
+    def __init__(self):
+        self.atoms: List[Pattern] = []
+        self.points: Set[int] = set()
+        self.signatures: Dict[str, FrozenSet[int]] = {}
+        self.edges: List[List[Tuple[int, int]]] = []
+        self.epsilons: List[List[int]] = []
+        self.start = 0
+        self.end = 0
+        self.pattern: Optional[Pattern] = None
+        self.sample: Optional[str] = None
+
+    def state(self) -> int:
+        # Add a state
+        if len(self.edges) >= limit_nfa:
+            raise Unsupported("too many states")
+
+        self.edges.append([])
+        self.epsilons.append([])
+
+        return len(self.edges) - 1
+
+    def atom(self, pattern: str, mode: int) -> int:
+        # Add a single character pattern
+        self.atoms.append(re.compile(pattern, mode & ~re.VERBOSE))
+
+        return len(self.atoms) - 1
+
+    def signature(self, char: str) -> FrozenSet[int]:
+        # Get the atoms matching the character
+        result = self.signatures.get(char)
+
+        if result is None:
+            result = frozenset(i for i, atom in enumerate(self.atoms) if atom.fullmatch(char))
+            self.signatures[char] = result
+
+        return result
+
+    def closure(self, states: Set[int]) -> FrozenSet[int]:
+        # Get the states reachable without reading any character
+        result = set(states)
+        stack = list(states)
+
+        while stack:
+            for target in self.epsilons[stack.pop()]:
+                if target not in result:
+                    result.add(target)
+                    stack.append(target)
+
+        return frozenset(result)
+
+
+def get_char(code: int) -> str:
+    # Get the escaped form of a code point
+    return "\\U%08x" % code
+
+
+def get_atom(nfa: Nfa, op: object, av: object, mode: int) -> int:
+    # Get the single character pattern of a node
+    if op is sre_constants.LITERAL:
+        nfa.points.add(av)
+        return nfa.atom(get_char(av), mode)
+
+    if op is sre_constants.NOT_LITERAL:
+        nfa.points.add(av)
+        return nfa.atom(f"[^{get_char(av)}]", mode)
+
+    if op is sre_constants.ANY:
+        return nfa.atom(".", mode)
+
+    items = ""
+
+    for item_op, item_av in av:
+        if item_op is sre_constants.NEGATE:
+            items = "^" + items
+        elif item_op is sre_constants.LITERAL:
+            nfa.points.add(item_av)
+            items += get_char(item_av)
+        elif item_op is sre_constants.RANGE:
+            low, high = item_av
+            nfa.points.update({low - 1, low, (low + high) // 2, high, high + 1} - {-1})
+            items += f"{get_char(low)}-{get_char(high)}"
+        elif item_op is sre_constants.CATEGORY and item_av in categories:
+            items += categories[item_av]
+        else:
+            raise Unsupported(f"class item {item_op}")
+
+    return nfa.atom(f"[{items}]", mode)
+
+
+def get_fragment(nfa: Nfa, nodes: sre_parse.SubPattern, mode: int) -> Tuple[int, int]:
+    # Build the states of a sequence, get its start and end
+    start = nfa.state()
+    end = start
+
+    for op, av in nodes:
+        s, e = get_node(nfa, op, av, mode)
+        nfa.epsilons[end].append(s)
+        end = e
+
+    return start, end
+
+
+def get_node(nfa: Nfa, op: object, av: object, mode: int) -> Tuple[int, int]:
+    # Build the states of a node, get its start and end
+    if op in {sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN}:
+        start = nfa.state()
+        end = nfa.state()
+        nfa.edges[start].append((get_atom(nfa, op, av, mode), end))
+
+        return start, end
+
+    if op is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, nodes = av
+        return get_fragment(nfa, nodes, (mode | add_flags) & ~del_flags)
+
+    if op is sre_constants.BRANCH:
+        start = nfa.state()
+        end = nfa.state()
+
+        for nodes in av[1]:
+            s, e = get_fragment(nfa, nodes, mode)
+            nfa.epsilons[start].append(s)
+            nfa.epsilons[e].append(end)
+
+        return start, end
+
+    if op in {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}:
+        low, high, nodes = av
+        unbounded = high is sre_constants.MAXREPEAT
+
+        if low > limit_repeat or (not unbounded and high > limit_repeat):
+            raise Unsupported("large repeat")
+
+        start = nfa.state()
+        end = start
+
+        for _ in range(low):
+            s, e = get_fragment(nfa, nodes, mode)
+            nfa.epsilons[end].append(s)
+            end = e
+
+        if unbounded:
+            s, e = get_fragment(nfa, nodes, mode)
+            nfa.epsilons[end].append(s)
+            nfa.epsilons[e].append(s)
+            last = nfa.state()
+            nfa.epsilons[end].append(last)
+            nfa.epsilons[e].append(last)
+
+            return start, last
+
+        last = nfa.state()
+        nfa.epsilons[end].append(last)
+
+        for _ in range(high - low):
+            s, e = get_fragment(nfa, nodes, mode)
+            nfa.epsilons[end].append(s)
+            nfa.epsilons[e].append(last)
+            end = e
+
+        return start, last
+
+    # Anchors, lookarounds, references, atomic groups and possessive repeats
+    raise Unsupported(f"node {op}")
+
+
+def get_sample(nfa: Nfa) -> Optional[str]:
+    # Get one of the shortest texts fully matched by the NFA
+    chars = "".join(chr(c) for c in sorted(nfa.points) if 0 <= c <= 0x10ffff) + pool
+    witnesses = [next((c for c in chars if atom.fullmatch(c)), None) for atom in nfa.atoms]
+    parents: Dict[int, Tuple[int, str]] = {}
+    frontier = nfa.closure({nfa.start})
+    seen = set(frontier)
+
+    if nfa.end in frontier:
+        return ""
+
+    while frontier:
+        reached = {}
+
+        for state in frontier:
+            for atom, target in nfa.edges[state]:
+                if witnesses[atom] is None or target in seen or target in reached:
+                    continue
+
+                reached[target] = (state, witnesses[atom])
+
+        if not reached:
+            return None
+
+        # Keep the path through the epsilon moves by pointing them to the state reading the character
+        parents.update(reached)
+        frontier = set()
+
+        for target in reached:
+            for state in nfa.closure({target}):
+                if state in seen:
+                    continue
+
+                seen.add(state)
+                frontier.add(state)
+
+                if state != target:
+                    parents.setdefault(state, parents[target])
+
+                if state == nfa.end:
+                    result = ""
+
+                    while state in parents:
+                        state, char = parents[state]
+                        result = char + result
+
+                    return result
+
+    return None
+
+
+@lru_cache(maxsize=16384)
+def get_nfa(word: str) -> Optional[Nfa]:
+    # Get the NFA of a rule, None if the rule is not regular
+    result = None
+    try:
+        nodes = sre_parse.parse(word, flags)
+        nfa = Nfa()
+        nfa.start, nfa.end = get_fragment(nfa, nodes, nodes.state.flags)
+        nfa.pattern = re.compile(word, flags)
+        nfa.sample = get_sample(nfa)
+        result = nfa
+    except Unsupported as e:
+        logger.info(f"Get nfa unsupported {word}: {e}")
+    except Exception as e:
+        logger.info(f"Get nfa error: {e}")
+
+    return result
+
+
+def get_classes(a: Nfa, b: Nfa) -> List[Tuple[FrozenSet[int], FrozenSet[int]]]:
+    # Group the characters by the atoms they match, get the atoms of each NFA matching each group
+    points = set(pool)
+
+    for code in a.points | b.points:
+        if not 0 <= code <= 0x10ffff:
+            continue
+
+        char = chr(code)
+        points.update(c for c in {char, char.lower(), char.upper()} if len(c) == 1)
+
+    return list(dict.fromkeys((a.signature(char), b.signature(char)) for char in sorted(points)))
+
+
+def get_move(nfa: Nfa, states: FrozenSet[int], atoms: FrozenSet[int]) -> Set[int]:
+    # Get the states reached by reading a character matching the atoms
+    return {target for state in states for atom, target in nfa.edges[state] if atom in atoms}
+
+
+def is_included(a: str, b: str) -> Optional[bool]:
+    # Check if every text fully matched by rule b contains a match of rule a, None if unknown
+    a_nfa = get_nfa(a)
+    b_nfa = get_nfa(b)
+
+    if a_nfa is None or b_nfa is None:
+        return None
+
+    a_start = a_nfa.closure({a_nfa.start})
+
+    # Rule a matches the empty string, so it hits every text
+    if a_nfa.end in a_start:
+        return True
+
+    first = (b_nfa.closure({b_nfa.start}), a_start)
+
+    if b_nfa.end in first[0]:
+        return False
+
+    # A text of rule b missed by rule a is enough to tell
+    if b_nfa.sample is not None and not a_nfa.pattern.search(b_nfa.sample):
+        return False
+
+    classes = get_classes(a_nfa, b_nfa)
+    seen = {first}
+    queue = [first]
+
+    for b_states, a_states in queue:
+        for a_atoms, b_atoms in classes:
+            b_next = b_nfa.closure(get_move(b_nfa, b_states, b_atoms))
+
+            if not b_next:
+                continue
+
+            # A match of rule a may start at any position
+            a_next = a_nfa.closure(get_move(a_nfa, a_states, a_atoms)) | a_start
+
+            if a_nfa.end in a_next:
+                continue
+
+            if b_nfa.end in b_next:
+                return False
+
+            state = (b_next, a_next)
+
+            if state in seen:
+                continue
+
+            if len(seen) >= limit_states:
+                return None
+
+            seen.add(state)
+            queue.append(state)
+
+    return True
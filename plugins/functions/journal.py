@@ -0,0 +1,156 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import pickle
+from glob import glob
+from os import O_RDONLY, close, fsync, open as os_open, remove, rename
+from os.path import dirname
+from struct import Struct
+from threading import Lock
+from typing import BinaryIO, Iterator, List, Optional
+from zlib import crc32
+
+# This module must not import glovar, glovar imports it
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Length and checksum of a record
+header = Struct("<II")
+
+
+def get_record(entry: tuple) -> bytes:
+    # Get the bytes of a journal entry
+    data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return header.pack(len(data), crc32(data)) + data
+
+
+def get_entries(path: str) -> Iterator[tuple]:
+    # Read the entries of a segment, stop at the first torn or corrupted record
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(header.size)
+
+            if len(head) < header.size:
+                return
+
+            length, checksum = header.unpack(head)
+            data = f.read(length)
+
+            if len(data) < length or crc32(data) != checksum:
+                logger.warning(f"Journal {path} is torn after {f.tell() - len(data) - header.size} bytes")
+                return
+
+            yield pickle.loads(data)
+
+
+class Journal:
+    # Append-only log of the changes made to a file since its last snapshot,
+    # the segments written since the snapshot before it are kept for the previous file
+    def __init__(self, path: str):
+        self.lock = Lock()
+        self.path = path
+        self.file: Optional[BinaryIO] = None
+        self.count = 0
+
+        # Snapshots are written one at a time, so an older one never replaces a newer one
+        self.saving = Lock()
+
+        # Never append to an existing segment, its tail may be torn
+        self.segment = max(self.segments(), default=0) + 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def segments(self, previous: bool = False) -> List[int]:
+        # Get the numbers of the segments on disk, or of the segments kept for the previous file
+        prefix = f"{self.path}.journal.previous." if previous else f"{self.path}.journal."
+
+        return sorted(int(p[len(prefix):]) for p in glob(f"{prefix}*") if p[len(prefix):].isdigit())
+
+    def append(self, *entry) -> None:
+        # Append an entry to the current segment, it is on disk when this returns
+        with self.lock:
+            if self.file is None:
+                self.file = open(f"{self.path}.journal.{self.segment}", "ab")
+
+                # The name of the new segment is on disk too
+                fd = os_open(dirname(self.path) or ".", O_RDONLY)
+
+                try:
+                    fsync(fd)
+                finally:
+                    close(fd)
+
+            self.file.write(get_record(entry))
+            self.file.flush()
+            fsync(self.file.fileno())
+            self.count += 1
+
+    def clear(self) -> None:
+        # Delete all segments on disk
+        paths = [f"{self.path}.journal.previous.{old}" for old in self.segments(True)]
+        paths += [f"{self.path}.journal.{old}" for old in self.segments()]
+
+        for path in paths:
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+
+    def replay(self, previous: bool = False) -> Iterator[tuple]:
+        # Read the entries of all segments on disk, starting from the previous file's segments if it is the one loaded
+        paths = [f"{self.path}.journal.previous.{segment}" for segment in self.segments(True)] if previous else []
+        paths += [f"{self.path}.journal.{segment}" for segment in self.segments()]
+
+        for path in paths:
+            for entry in get_entries(path):
+                self.count += 1
+                yield entry
+
+    def rotate(self) -> int:
+        # Start a new segment, get its number, the older segments are covered by the snapshot taken at the same time
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+
+            self.file = None
+            self.segment += 1
+            self.count = 0
+
+            return self.segment
+
+    def prune(self, segment: int) -> None:
+        # The snapshot of the segment is written, the file it replaced is the previous file now,
+        # so keep the segments older than the segment for it, and delete the ones kept for the file before it
+        for old in self.segments(True):
+            try:
+                remove(f"{self.path}.journal.previous.{old}")
+            except FileNotFoundError:
+                pass
+
+        for old in self.segments():
+            if old >= segment:
+                continue
+
+            try:
+                rename(f"{self.path}.journal.{old}", f"{self.path}.journal.previous.{old}")
+            except FileNotFoundError:
+                pass
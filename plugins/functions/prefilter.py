@@ -0,0 +1,337 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from itertools import product
+from threading import Lock
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .engine import flags, fold, sre_constants, sre_parse
+
+# This module must not import glovar, glovar imports it
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Most strings kept while expanding literals
+limit = 32
+
+
+def get_better(a: Optional[Set[str]], b: Optional[Set[str]]) -> Optional[Set[str]]:
+    # Get the more selective set of required literals
+    a = a if a and "" not in a else None
+    b = b if b and "" not in b else None
+
+    if not a or not b:
+        return a or b
+
+    a_score = (min(len(s) for s in a), -len(a))
+    b_score = (min(len(s) for s in b), -len(b))
+
+    return a if a_score >= b_score else b
+
+
+def get_class(items: list) -> Optional[Set[str]]:
+    # Get the characters of a character class
+    result = set()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            result.add(fold(chr(av)))
+        elif op is sre_constants.RANGE and av[1] - av[0] < limit:
+            result.update(fold(chr(c)) for c in range(av[0], av[1] + 1))
+        else:
+            return None
+
+        if len(result) > limit:
+            return None
+
+    return result
+
+
+def get_node(op: object, av: object) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+    # Get the exact strings and the required literals of a node
+    if op is sre_constants.LITERAL:
+        result = {fold(chr(av))}
+        return result, result
+
+    if op is sre_constants.IN:
+        result = get_class(av)
+        return result, result
+
+    if op in {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT}:
+        return {""}, None
+
+    if op is sre_constants.SUBPATTERN:
+        return get_sequence(av[-1])
+
+    if op is getattr(sre_constants, "ATOMIC_GROUP", None):
+        return get_sequence(av)
+
+    if op is sre_constants.BRANCH:
+        branches = [get_sequence(b) for b in av[1]]
+        exact = set()
+        required = set()
+
+        for e, r in branches:
+            if exact is not None and e is not None and len(exact) + len(e) <= limit:
+                exact |= e
+            else:
+                exact = None
+
+            best = get_better(r, e)
+
+            if required is not None and best:
+                required |= best
+            else:
+                required = None
+
+        return exact, required
+
+    if op in {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, "POSSESSIVE_REPEAT", None)}:
+        low, high, sub = av
+        e, r = get_sequence(sub)
+
+        if low == 0:
+            if high == 1 and e is not None:
+                return e | {""}, None
+
+            return None, None
+
+        exact = None
+
+        if low == high and e is not None and low <= 8 and len(e) ** low <= limit:
+            exact = {"".join(p) for p in product(e, repeat=low)}
+
+        return exact, get_better(r, e)
+
+    return None, None
+
+
+def get_sequence(nodes: sre_parse.SubPattern) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+    # Get the exact strings and the required literals of a sequence
+    run = {""}
+    best = None
+    exact = True
+
+    for op, av in nodes:
+        e, r = get_node(op, av)
+        best = get_better(best, r)
+
+        if e is None:
+            best = get_better(best, run)
+            run = {""}
+            exact = False
+        elif len(run) * len(e) <= limit:
+            run = {a + b for a in run for b in e}
+        else:
+            best = get_better(best, run)
+            run = e
+            exact = False
+
+    best = get_better(best, run)
+
+    return (run if exact else None), best
+
+
+def get_literals(word: str) -> FrozenSet[str]:
+    # Get the literals that any match of the rule contains at least one of, empty if unknown
+    result = frozenset()
+    try:
+        _, required = get_sequence(sre_parse.parse(word, flags))
+        result = frozenset(required or ())
+    except Exception as e:
+        logger.info(f"Get literals error: {e}")
+
+    return result
+
+
+def get_width(word: str) -> int:
+    # Get the minimum length of any match of the rule
+    result = 0
+    try:
+        result = sre_parse.parse(word, flags).getwidth()[0]
+    except Exception as e:
+        logger.info(f"Get width error: {e}")
+
+    return result
+
+
+def get_grams(text: str) -> Set[str]:
+    # Get the characters and the character pairs of a folded text
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class Automaton:
+    # Aho-Corasick automaton over folded literals
+    def __init__(self, literals: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+
+        for literal in literals:
+            state = 0
+
+            for char in literal:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+
+                state = self.goto[state][char]
+
+            self.output[state].append(literal)
+
+        queue = list(self.goto[0].values())
+
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+
+                fail = self.goto[fail].get(char, 0)
+                self.fail[child] = fail
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: str) -> Set[str]:
+        # Find all literals occurring in the folded text
+        result = set()
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(char, 0)
+
+            if output[state]:
+                result.update(output[state])
+
+        return result
+
+
+class Prefilter:
+    # Required literals of a word type's rules
+    def __init__(self):
+        self.lock = Lock()
+        self.literals: Dict[str, FrozenSet[str]] = {}
+        self.owners: Dict[str, Set[str]] = {}
+        self.always: Set[str] = set()
+        self.automaton: Optional[Automaton] = None
+
+    def add(self, word: str) -> None:
+        # Parse the rule once and keep its literals
+        with self.lock:
+            literals = get_literals(word)
+            self.literals[word] = literals
+
+            if not literals:
+                self.always.add(word)
+
+            for literal in literals:
+                self.owners.setdefault(literal, set()).add(word)
+
+            self.automaton = None
+
+    def remove(self, word: str) -> None:
+        # Forget the rule's literals
+        with self.lock:
+            self.always.discard(word)
+
+            for literal in self.literals.pop(word, ()):
+                owners = self.owners.get(literal, set())
+                owners.discard(word)
+
+                if not owners:
+                    self.owners.pop(literal, None)
+
+            self.automaton = None
+
+    def candidates(self, *texts: str) -> Set[str]:
+        # Get the rules that may hit any of the folded texts
+        with self.lock:
+            if self.automaton is None:
+                self.automaton = Automaton(list(self.owners))
+
+            result = set(self.always)
+
+            for text in set(texts):
+                for literal in self.automaton.find(text):
+                    result |= self.owners[literal]
+
+        return result
+
+
+class SampleIndex:
+    # Character n-grams and lengths of the rules' samples
+    def __init__(self):
+        self.lock = Lock()
+        self.grams: Dict[str, Set[str]] = {}
+        self.rules: Dict[str, Tuple[FrozenSet[str], int, int]] = {}
+
+    def add(self, word: str, samples: Iterable[str]) -> None:
+        # Index the samples of a rule
+        with self.lock:
+            if word in self.rules:
+                return
+
+            samples = [fold(s) for s in samples]
+            grams = frozenset(g for s in samples for g in get_grams(s))
+            self.rules[word] = (grams, get_width(word), max((len(s) for s in samples), default=0))
+
+            for gram in grams:
+                self.grams.setdefault(gram, set()).add(word)
+
+    def remove(self, word: str) -> None:
+        # Forget the samples of a rule
+        with self.lock:
+            grams, _, _ = self.rules.pop(word, (frozenset(), 0, 0))
+
+            for gram in grams:
+                owners = self.grams.get(gram, set())
+                owners.discard(word)
+
+                if not owners:
+                    self.grams.pop(gram, None)
+
+    def containing(self, literals: FrozenSet[str], width: int) -> Set[str]:
+        # Get the rules with a sample that may contain one of the literals and is long enough
+        with self.lock:
+            if literals:
+                result = set()
+
+                for literal in literals:
+                    grams = get_grams(literal) if len(literal) < 2 else get_grams(literal) - set(literal)
+                    owners = [self.grams.get(g, set()) for g in grams]
+                    result |= set.intersection(*owners) if owners else set(self.rules)
+            else:
+                result = set(self.rules)
+
+            return {w for w in result if self.rules.get(w, (None, 0, 0))[2] >= width}
+
+    def fits(self, words: Iterable[str], length: int) -> Set[str]:
+        # Get the rules that can match a text of the length
+        with self.lock:
+            return {w for w in words if self.rules.get(w, (None, 0, 0))[1] <= length}
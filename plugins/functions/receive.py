@@ -19,20 +19,44 @@
 import logging
 import pickle
 from json import loads
-from typing import Any
+from typing import Any, List
 
 from pyrogram import Client, Message
 
 from .. import glovar
-from .channel import share_data
+from .channel import share_data, share_regex_sync, share_regex_update
 from .etc import code, get_now, get_text, lang, mention_id, thread
-from .file import crypt_file, data_to_file, delete_file, get_downloaded_path, get_new_path, save
+from .file import compress_file, crypt_file, data_to_file, delete_file, get_bundle, get_downloaded_path
+from .file import get_new_path, save, save_rules
 from .telegram import send_document
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
 
+def receive_backup_reply(data: dict) -> bool:
+    # Receive the acknowledgement of a backup bundle
+    try:
+        sent = glovar.backups.get("sent", {})
+
+        # Only the last generation counts, an older one is covered by it
+        if not sent or data.get("generation") != sent["generation"]:
+            return True
+
+        glovar.backups["hashes"] = sent["hashes"]
+
+        if sent["full"]:
+            glovar.backups["full"] = sent["time"]
+
+        save("backups")
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive backup reply error: {e}", exc_info=True)
+
+    return False
+
+
 def receive_captcha_data(client: Client, message: Message, data: dict) -> bool:
     # Receive captcha data
     try:
@@ -69,18 +93,8 @@ def receive_count(client: Client, message: Message, data: str) -> bool:
         if not data:
             return True
 
-        data_set = set(data)
-        word_set = set(eval(f"glovar.{word_type}_words"))
-        the_set = data_set & word_set
-
-        for word in the_set:
-            eval(f"glovar.{word_type}_words")[word]["today"] += data[word]
-            eval(f"glovar.{word_type}_words")[word]["total"] += data[word]
-            total = eval(f"glovar.{word_type}_words")[word]["total"]
-            time = get_now() - eval(f"glovar.{word_type}_words")[word]["time"]
-            eval(f"glovar.{word_type}_words")[word]["average"] = total / (time / 86400)
-
-        save(f"{word_type}_words")
+        glovar.rules.count(word_type, data, get_now())
+        save_rules(word_type)
 
         return True
     except Exception as e:
@@ -115,17 +129,102 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
             path_decrypted = ""
             path_final = path
 
-        with open(path_final, "rb") as f:
-            data = pickle.load(f)
+        # Files without the compression key are plain pickles sent by older bots
+        envelope = receive_text_data(message)
+        compression = envelope.get("compression")
 
-        for f in {path, path_decrypted}:
-            thread(delete_file, (f,))
+        if compression in {"lzma", "zlib"}:
+            path_decompressed = get_new_path()
+            name = envelope["data"] if isinstance(envelope.get("data"), str) else envelope.get("type", "")
+
+            if compress_file("decompress", compression, path_final, path_decompressed, name):
+                path_final = path_decompressed
+            else:
+                logger.warning(f"Receive file error: {name} can not be decompressed, the file is dropped")
+                path_final = ""
+        else:
+            path_decompressed = ""
+
+        if path_final and envelope.get("type") == "bundle":
+            data = list(get_bundle(path_final))
+        elif path_final:
+            with open(path_final, "rb") as f:
+                data = pickle.load(f)
+
+        for f in {path, path_decrypted, path_decompressed}:
+            if f:
+                thread(delete_file, (f,))
     except Exception as e:
         logger.warning(f"Receive file error: {e}", exc_info=True)
 
     return data
 
 
+def receive_regex_bundle(client: Client, message: Message, sender: str) -> bool:
+    # Receive the counts of many word types in one file
+    glovar.locks["regex"].acquire()
+    try:
+        data = receive_file_data(client, message)
+
+        if not data:
+            return True
+
+        now = get_now()
+
+        for entry, counts in data:
+            word_type = entry.get("name", "").replace("_words", "")
+
+            if (entry.get("type") != "count" or word_type not in glovar.regex
+                    or sender not in glovar.receivers[word_type] or not counts):
+                continue
+
+            glovar.rules.count(word_type, counts, now)
+            save_rules(word_type)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive regex bundle error: {e}", exc_info=True)
+    finally:
+        glovar.locks["regex"].release()
+
+    return False
+
+
+def receive_regex_request(client: Client, sender: str, data: List[str]) -> bool:
+    # Receive the request of the whole rule sets
+    try:
+        for word_type in data:
+            if word_type not in glovar.regex or sender not in glovar.receivers[word_type]:
+                continue
+
+            share_regex_update(client, word_type, [sender])
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive regex request error: {e}", exc_info=True)
+
+    return False
+
+
+def receive_regex_sync(client: Client, sender: str, data: dict) -> bool:
+    # Receive the versions of a bot's rule sets, answer for the ones out of date
+    try:
+        for word_type, version in data.items():
+            if word_type not in glovar.regex or sender not in glovar.receivers[word_type]:
+                continue
+
+            if not isinstance(version, dict):
+                version = {}
+
+            share_regex_sync(client, word_type, sender, version)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive regex sync error: {e}", exc_info=True)
+
+    return False
+
+
 def receive_status_ask(client: Client, data: dict) -> bool:
     # Receive version info request
     glovar.locks["regex"].acquire()
@@ -137,10 +236,10 @@ def receive_status_ask(client: Client, data: dict) -> bool:
         status = {}
 
         for word_type in glovar.regex:
-            if not eval(f"glovar.{word_type}_words"):
+            if not glovar.rules[word_type]:
                 continue
 
-            status[lang(word_type)] = f"{len(eval(f'glovar.{word_type}_words'))} {lang('rules')}"
+            status[lang(word_type)] = f"{len(glovar.rules[word_type])} {lang('rules')}"
 
         file = data_to_file(status)
         share_data(
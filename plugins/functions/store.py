@@ -0,0 +1,546 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from array import array
+from hashlib import blake2b
+from itertools import compress
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Set, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .engine import Engine
+from .database import Table
+from .journal import Journal
+from .prefilter import Prefilter, SampleIndex
+
+# This module must not import glovar, glovar imports it
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def is_temporary(word_type: str, word: str) -> bool:
+    # Check if the rule is removed automatically after it is not used for days
+    comments = [comment.split(")")[0].strip() for comment in word.split("(?# ")[1:]]
+
+    if any("temp" in comment for comment in comments):
+        return True
+
+    return word_type == "ban" and not any("forever" in comment for comment in comments)
+
+
+def get_hash(word: str) -> int:
+    # Get the hash of a rule, the hash of a rule set is the sum of its rules' hashes, so it does not depend on the order
+    return int.from_bytes(blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def get_value(code: str, value: Union[float, int]) -> Union[float, int]:
+    # Get the value stored in a column of the type code
+    return float(value or 0) if code == "d" else int(value or 0)
+
+
+class Stats:
+    # Statistics of a word type's rules, one array per field, indexed by the rule's position
+    __slots__ = ("word_type", "index", "words", "digest", "temporary",
+                 "time", "average", "today", "total", "temp", "who")
+
+    fields: Dict[str, str] = {
+        "time": "q",
+        "average": "d",
+        "today": "q",
+        "total": "q",
+        "temp": "q",
+        "who": "q"
+    }
+
+    def __init__(self, word_type: str, words: Dict[str, Dict[str, Union[float, int]]] = None):
+        self.word_type = word_type
+        self.index: Dict[str, int] = {}
+        self.words: List[str] = []
+
+        # Sum of the rules' hashes, kept up to date by add and remove
+        self.digest = 0
+
+        # Whether each rule may be removed by the daily reset, decided once when the rule is added
+        self.temporary = array("b")
+
+        for field, code in self.fields.items():
+            setattr(self, field, array(code))
+
+        for word, status in (words or {}).items():
+            self.add(word, status)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.index))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, word: str, status: Dict[str, Union[float, int]]) -> None:
+        # Add a rule, or replace the status of an existing rule
+        i = self.index.get(word)
+
+        if i is None:
+            self.index[word] = len(self.words)
+            self.words.append(word)
+            self.digest = (self.digest + get_hash(word)) % 2 ** 64
+            self.temporary.append(is_temporary(self.word_type, word))
+
+            for field, code in self.fields.items():
+                getattr(self, field).append(get_value(code, status.get(field, 0)))
+
+            return
+
+        for field, code in self.fields.items():
+            getattr(self, field)[i] = get_value(code, status.get(field, 0))
+
+    def count(self, word: str, number: int, now: int) -> None:
+        # Count the usage of a rule
+        i = self.index[word]
+        self.today[i] += number
+        self.total[i] += number
+        self.average[i] = self.total[i] / ((now - self.time[i]) / 86400)
+
+    def fill(self, status: Dict[str, Union[float, int]]) -> None:
+        # Give all rules the same status
+        for field, code in self.fields.items():
+            setattr(self, field, array(code, [get_value(code, status.get(field, 0))]) * len(self.words))
+
+    def get(self, word: str) -> Dict[str, Union[float, int]]:
+        # Get the status of a rule as a dict
+        i = self.index[word]
+
+        return {field: getattr(self, field)[i] for field in self.fields}
+
+    def get_digest(self) -> str:
+        # Get the content hash of the rule set
+        return format(self.digest, "016x")
+
+    def remove(self, word: str) -> Dict[str, Union[float, int]]:
+        # Remove a rule, get its status, the last rule takes its position
+        i = self.index.get(word)
+
+        if i is None:
+            return {}
+
+        result = self.get(word)
+        last = len(self.words) - 1
+
+        if i != last:
+            moved = self.words[last]
+            self.words[i] = moved
+            self.index[moved] = i
+            self.temporary[i] = self.temporary[last]
+
+            for field in self.fields:
+                column = getattr(self, field)
+                column[i] = column[last]
+
+        self.words.pop()
+        self.index.pop(word)
+        self.digest = (self.digest - get_hash(word)) % 2 ** 64
+        self.temporary.pop()
+
+        for field in self.fields:
+            getattr(self, field).pop()
+
+        return result
+
+    def reset(self, limit: int) -> List[str]:
+        # Start a new day, get the temporary rules that have not been used for "limit" days
+        if numpy is not None and self.words:
+            today = numpy.frombuffer(self.today, dtype=numpy.int64)
+            temp = numpy.frombuffer(self.temp, dtype=numpy.int64)
+            temporary = numpy.frombuffer(self.temporary, dtype=numpy.bool_)
+            temp[:] = numpy.where(today == 0, temp + 1, 0)
+            today[:] = 0
+            expired = numpy.flatnonzero((temp >= limit) & temporary)
+
+            # Release the views, the arrays can not be resized while they are exported
+            del today, temp, temporary
+
+            return [self.words[i] for i in expired.tolist()]
+
+        self.temp = array("q", [0 if today else temp + 1 for today, temp in zip(self.today, self.temp)])
+        self.today = array("q", bytes(len(self.today) * self.today.itemsize))
+
+        return [self.words[i] for i in compress(range(len(self.words)), self.temporary) if self.temp[i] >= limit]
+
+    def to_dict(self) -> Dict[str, Dict[str, Union[float, int]]]:
+        # Export the statistics in the layout of the {type}_words files
+        columns = [(field, getattr(self, field)) for field in self.fields]
+
+        return {word: {field: column[i] for field, column in columns} for word, i in self.index.items()}
+
+
+class Delta:
+    # Changes of a word type's rules made since its last shared version
+    __slots__ = ("added", "changed", "removed")
+
+    def __init__(self):
+        self.added: Dict[str, Dict[str, Union[float, int]]] = {}
+        self.changed: Dict[str, Dict[str, Union[float, int]]] = {}
+        self.removed: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def add(self, word: str, status: Dict[str, Union[float, int]]) -> None:
+        # Record an added rule, or a replaced status
+        self.removed.discard(word)
+        self.changed.pop(word, None)
+        self.added[word] = status
+
+    def merge(self, other: "Delta") -> None:
+        # Record the changes of the next delta
+        for word in other.removed:
+            self.remove(word)
+
+        for word, status in other.added.items():
+            self.add(word, status)
+
+        self.update(other.changed)
+
+    def remove(self, word: str) -> None:
+        # Record a removed rule, the removal is kept even if the rule was added after the last version
+        self.added.pop(word, None)
+        self.changed.pop(word, None)
+        self.removed.add(word)
+
+    def update(self, statuses: Dict[str, Dict[str, Union[float, int]]]) -> None:
+        # Record the new statuses of existing rules
+        for word, status in statuses.items():
+            if word in self.added:
+                self.added[word] = status
+            else:
+                self.changed[word] = status
+
+    def to_dict(self) -> Dict[str, Union[Dict[str, Dict[str, Union[float, int]]], List[str]]]:
+        # Export the changes, applying them twice changes nothing
+        return {
+            "added": self.added,
+            "changed": self.changed,
+            "removed": sorted(self.removed)
+        }
+
+
+class Rules:
+    # Rules of a word type and the structures built from them
+    __slots__ = ("stats", "samples", "compiled", "engine", "prefilter", "index")
+
+    def __init__(self, word_type: str, words: Dict[str, Dict[str, Union[float, int]]] = None):
+        self.stats: Stats = Stats(word_type, words)
+        self.samples: Dict[str, List[str]] = {w: s["samples"] for w, s in (words or {}).items() if s.get("samples")}
+        self.compiled: Dict[str, Pattern] = {}
+        self.engine: Optional[Engine] = None
+        self.prefilter: Optional[Prefilter] = None
+        self.index: Optional[SampleIndex] = None
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.stats
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.stats)
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def to_dict(self) -> Dict[str, Dict[str, Union[float, int, List[str]]]]:
+        # Export the statistics and the samples in the layout of the {type}_words files
+        result = self.stats.to_dict()
+
+        for word, samples in self.samples.items():
+            if word in result:
+                result[word]["samples"] = samples
+
+        return result
+
+
+class RuleStore:
+    # Rules of all word types, loaded from and exported to the layout of the {type}_words files
+    def __init__(self, word_types: Iterable[str], journals: Dict[str, Union[Journal, Table]] = None):
+        self.lock = Lock()
+        self.rules: Dict[str, Rules] = {word_type: Rules(word_type) for word_type in word_types}
+        self.types: Dict[str, Set[str]] = {}
+
+        # Changes made since the last snapshot of each word type, nothing is kept without journals
+        self.journals: Dict[str, Union[Journal, Table]] = journals or {}
+
+        # Changes made since the last shared version of each word type, and that version as (base, sequence)
+        self.deltas: Dict[str, Delta] = {word_type: Delta() for word_type in self.rules}
+        self.versions: Dict[str, Tuple[int, int]] = {}
+
+        # Deltas shared since the base version, and the content hash of each version, indexed by the sequence
+        self.history: Dict[str, List[Delta]] = {word_type: [] for word_type in self.rules}
+        self.hashes: Dict[str, List[str]] = {word_type: [] for word_type in self.rules}
+
+    def __contains__(self, word_type: str) -> bool:
+        return word_type in self.rules
+
+    def __getitem__(self, word_type: str) -> Rules:
+        return self.rules[word_type]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.rules)
+
+    def add(self, word_type: str, word: str, status: Dict[str, Union[float, int]]) -> None:
+        # Add a rule, or replace the status of an existing rule, the bot adds rules with filters.add_rule
+        with self.lock:
+            self.apply(word_type, ("add", word, status))
+            self.log(word_type, "add", word, self.rules[word_type].stats.get(word))
+
+    def apply(self, word_type: str, entry: tuple) -> None:
+        # Apply a journal entry
+        rules = self.rules[word_type]
+        stats = rules.stats
+        action = entry[0]
+
+        if action == "add":
+            _, word, status = entry
+            stats.add(word, status)
+            self.types.setdefault(word, set()).add(word_type)
+        elif action == "remove":
+            _, word = entry
+            stats.remove(word)
+            rules.samples.pop(word, None)
+            types = self.types.get(word, set())
+            types.discard(word_type)
+
+            if not types:
+                self.types.pop(word, None)
+        elif action == "update":
+            _, statuses = entry
+
+            for word, status in statuses.items():
+                if word in stats:
+                    stats.add(word, status)
+        elif action == "fill":
+            _, status = entry
+            stats.fill(status)
+        elif action == "reset":
+            _, limit = entry
+            stats.reset(limit)
+        elif action == "samples":
+            _, samples = entry
+
+            for word, sample in samples.items():
+                if word in stats:
+                    rules.samples[word] = sample
+
+    def checksum(self, word_type: str) -> str:
+        # Get the content hash of the rules and their statuses, an empty rule set has none
+        with self.lock:
+            rules = self.rules[word_type]
+            stats = rules.stats
+
+            if not stats.words:
+                return ""
+
+            result = blake2b(digest_size=16)
+
+            for word in stats.words:
+                result.update(word.encode("utf-8"))
+
+            for field in stats.fields:
+                result.update(getattr(stats, field).tobytes())
+
+            return result.hexdigest()
+
+    def count(self, word_type: str, data: Dict[str, int], now: int) -> None:
+        # Count the usage of the rules, the journal keeps the new statuses, so replaying it twice changes nothing
+        with self.lock:
+            stats = self.rules[word_type].stats
+            words = [word for word in data if word in stats]
+
+            for word in words:
+                stats.count(word, data[word], now)
+
+            if words:
+                self.log(word_type, "update", {word: stats.get(word) for word in words})
+
+    def export(self, word_type: str) -> Dict[str, Dict[str, Union[float, int, List[str]]]]:
+        # Get the words dict of a word type, with the samples of the rules
+        with self.lock:
+            return self.rules[word_type].to_dict()
+
+    def fill(self, word_type: str, status: Dict[str, Union[float, int]]) -> None:
+        # Give all rules of a word type the same status, the journal keeps one entry for all of them
+        with self.lock:
+            self.apply(word_type, ("fill", status))
+            self.log(word_type, "fill", status)
+
+    def get_types(self, word: str) -> Set[str]:
+        # Get the word types holding the rule
+        return set(self.types.get(word, set()))
+
+    def get_version(self, word_type: str) -> Dict[str, Union[int, str]]:
+        # Get the last shared version of a word type, and its content hash
+        base, sequence = self.versions.get(word_type, (0, 0))
+        hashes = self.hashes[word_type]
+
+        return {"base": base, "sequence": sequence, "hash": hashes[-1] if hashes else ""}
+
+    def load(self, word_type: str, words: Dict[str, Dict[str, Union[float, int]]]) -> None:
+        # Replace all rules of a word type, the structures built from the old rules are dropped
+        with self.lock:
+            for word in self.rules[word_type]:
+                types = self.types.get(word, set())
+                types.discard(word_type)
+
+                if not types:
+                    self.types.pop(word, None)
+
+            self.rules[word_type] = Rules(word_type, words)
+
+            for word in words:
+                self.types.setdefault(word, set()).add(word_type)
+
+    def log(self, word_type: str, *entry) -> None:
+        # Record an entry in the delta of the word type, and append it to the journal,
+        # filling and resetting only change the statuses, so the consumers get them with the next whole rule set
+        action = entry[0]
+        delta = self.deltas[word_type]
+
+        if action == "add":
+            delta.add(*entry[1:])
+        elif action == "remove":
+            delta.remove(*entry[1:])
+        elif action == "update":
+            delta.update(*entry[1:])
+
+        journal = self.journals.get(word_type)
+
+        if journal is None:
+            return
+
+        try:
+            journal.append(*entry)
+        except Exception as e:
+            logger.error(f"Log {word_type} error: {e}", exc_info=True)
+
+    def remove(self, word_type: str, word: str) -> Dict[str, Union[float, int]]:
+        # Remove a rule, get its status, the bot removes rules with filters.remove_rule
+        with self.lock:
+            if word not in self.rules[word_type]:
+                return {}
+
+            result = self.rules[word_type].stats.get(word)
+            self.apply(word_type, ("remove", word))
+            self.log(word_type, "remove", word)
+
+        return result
+
+    def replay(self, word_type: str, previous: bool = False) -> int:
+        # Apply the journal written since the last snapshot, or since the previous one, get the number of entries
+        result = 0
+        journal = self.journals.get(word_type)
+
+        if journal is None:
+            return result
+
+        with self.lock:
+            for entry in journal.replay(previous):
+                self.apply(word_type, entry)
+                result += 1
+
+        return result
+
+    def request(self, word_type: str) -> Tuple[dict, Dict[str, Dict[str, Union[float, int]]]]:
+        # Get the current version and the whole rule set, sharing the changes in it again later is harmless
+        with self.lock:
+            stats = self.rules[word_type].stats
+
+            return dict(self.get_version(word_type), hash=stats.get_digest()), stats.to_dict()
+
+    def reset(self, word_type: str, limit: int) -> List[str]:
+        # Start a new day, get the temporary rules that have not been used for "limit" days
+        with self.lock:
+            result = self.rules[word_type].stats.reset(limit)
+            self.log(word_type, "reset", limit)
+
+        return result
+
+    def set_samples(self, word_type: str, samples: Dict[str, List[str]]) -> None:
+        # Keep the samples of the rules, the journal writes them with the rules
+        with self.lock:
+            self.apply(word_type, ("samples", samples))
+            self.log(word_type, "samples", samples)
+
+    def share(self, word_type: str, limit: int, full: bool = False) -> Tuple[str, dict, dict]:
+        # Take the changes not shared yet, get the action type of the update, its version and its data
+        with self.lock:
+            stats = self.rules[word_type].stats
+            delta = self.deltas[word_type]
+            base, sequence = self.versions.get(word_type, (0, 0))
+
+            if base and not full and not delta:
+                return "", self.get_version(word_type), {}
+
+            self.deltas[word_type] = Delta()
+
+            # A new base version starts with the whole rule set, when a long delta chain costs the consumers more
+            if not base or full or sequence >= limit or len(delta) > len(stats) // 2:
+                self.versions[word_type] = (max(int(time() * 1000), base + 1), 0)
+                self.history[word_type] = []
+                self.hashes[word_type] = [stats.get_digest()]
+
+                return "update", self.get_version(word_type), stats.to_dict()
+
+            self.versions[word_type] = (base, sequence + 1)
+            self.history[word_type].append(delta)
+            self.hashes[word_type].append(stats.get_digest())
+
+            return "delta", dict(self.get_version(word_type), since=sequence), delta.to_dict()
+
+    def snapshot(self, word_type: str) -> Tuple[Dict[str, Dict[str, Union[float, int, List[str]]]], int]:
+        # Export the words dict and start a new journal segment at once, get both
+        with self.lock:
+            journal = self.journals.get(word_type)
+
+            return self.rules[word_type].to_dict(), journal.rotate() if journal else 0
+
+    def sync(self, word_type: str, version: dict) -> Tuple[str, dict, dict]:
+        # Get what a consumer at the version misses, one delta of the versions after it, or the whole rule set
+        with self.lock:
+            base, sequence = self.versions.get(word_type, (0, 0))
+            since = version.get("sequence")
+            digest = version.get("hash")
+
+            if (base and version.get("base") == base and isinstance(since, int) and 0 <= since <= sequence
+                    and (not digest or digest == self.hashes[word_type][since])):
+                if since == sequence:
+                    return "", self.get_version(word_type), {}
+
+                delta = Delta()
+
+                for other in self.history[word_type][since:]:
+                    delta.merge(other)
+
+                return "delta", dict(self.get_version(word_type), since=since), delta.to_dict()
+
+        return ("update",) + self.request(word_type)
+
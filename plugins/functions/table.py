@@ -0,0 +1,216 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from collections import OrderedDict
+from sys import getsizeof
+from threading import Lock
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+# This module must not import glovar, glovar imports it
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def get_special(rule: str) -> Tuple[str, str]:
+    # Get the characters and the value of a special characters rule, such as "[аa](?# a)"
+    try:
+        # Check keys
+        if "[" not in rule:
+            return "", ""
+
+        # Check value
+        if "?#" not in rule:
+            return "", ""
+
+        keys = rule.split("]")[0][1:]
+        value = rule.split("?#")[1][1]
+
+        return keys, value
+    except Exception as e:
+        logger.info(f"Get special error: {e}")
+
+    return "", ""
+
+
+class CharMap:
+    # Special characters of a word type, the rule added last wins, same as the order of the words dict
+    def __init__(self):
+        self.dict: Dict[str, str] = {}
+        self.owners: Dict[str, Dict[str, str]] = {}
+        self.rules: Dict[str, str] = {}
+
+    def add(self, rule: str) -> Set[str]:
+        # Add a rule, get the characters whose value changed
+        result = set()
+        keys, value = get_special(rule)
+
+        if not keys or rule in self.rules:
+            return result
+
+        self.rules[rule] = keys
+
+        for k in set(keys):
+            self.owners.setdefault(k, {})[rule] = value
+
+            if self.dict.get(k) != value:
+                self.dict[k] = value
+                result.add(k)
+
+        return result
+
+    def remove(self, rule: str) -> Set[str]:
+        # Remove a rule, get the characters whose value changed
+        result = set()
+
+        for k in set(self.rules.pop(rule, "")):
+            owners = self.owners.get(k, {})
+            owners.pop(rule, None)
+
+            if owners:
+                value = next(reversed(owners.values()))
+            else:
+                self.owners.pop(k, None)
+                value = None
+
+            if self.dict.get(k) == value:
+                continue
+
+            if value is None:
+                self.dict.pop(k, None)
+            else:
+                self.dict[k] = value
+
+            result.add(k)
+
+        return result
+
+
+class SpecialTable:
+    # Translate table fusing the spc and spe characters, spc goes first
+    def __init__(self):
+        self.lock = Lock()
+        self.maps: Dict[str, CharMap] = {"spc": CharMap(), "spe": CharMap()}
+        self.table: Dict[int, str] = {}
+
+    def add(self, word_type: str, rule: str) -> bool:
+        # Add a special characters rule, return True if the table changed
+        with self.lock:
+            changed = self.maps[word_type].add(rule)
+            return self.update(word_type, changed)
+
+    def remove(self, word_type: str, rule: str) -> bool:
+        # Remove a special characters rule, return True if the table changed
+        with self.lock:
+            changed = self.maps[word_type].remove(rule)
+            return self.update(word_type, changed)
+
+    def update(self, word_type: str, changed: Set[str]) -> bool:
+        # Update the entries depending on the changed characters, the table is replaced, not modified
+        if not changed:
+            return False
+
+        spc_dict = self.maps["spc"].dict
+        spe_dict = self.maps["spe"].dict
+
+        if word_type == "spe":
+            changed = changed | {k for k, v in spc_dict.items() if v in changed}
+
+        table = dict(self.table)
+
+        for k in changed:
+            if k in spc_dict or k in spe_dict:
+                value = spc_dict.get(k, k)
+                table[ord(k)] = spe_dict.get(value, value)
+            else:
+                table.pop(ord(k), None)
+
+        self.table = table
+
+        return True
+
+
+class Printable(dict):
+    # Translate table that drops unprintable characters, filled on demand
+    def __missing__(self, key: int) -> Optional[int]:
+        char = chr(key)
+
+        if char.isprintable() or char in {"\n", "\r", "\t"}:
+            value = key
+        else:
+            value = None
+
+        self[key] = value
+
+        return value
+
+
+class Cache:
+    # LRU cache of converted texts, bounded by entries and by memory
+    def __init__(self, size: int, memory: int):
+        self.size = size
+        self.memory = memory
+        self.lock = Lock()
+        self.items: OrderedDict = OrderedDict()
+        self.used = 0
+        self.generation = 0
+        self.hit = 0
+        self.miss = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def clear(self) -> None:
+        # Drop all entries, results computed before this are not stored
+        with self.lock:
+            self.items.clear()
+            self.used = 0
+            self.generation += 1
+
+    def get(self, key: Hashable) -> Optional[str]:
+        # Get the cached value and mark it as recently used
+        with self.lock:
+            item = self.items.get(key)
+
+            if item is None:
+                self.miss += 1
+                return None
+
+            self.hit += 1
+            self.items.move_to_end(key)
+
+            return item[0]
+
+    def set(self, key: Hashable, value: str, generation: int) -> None:
+        # Store the value if the cache was not cleared since the generation
+        cost = getsizeof(key) + sum(getsizeof(k) for k in key if isinstance(k, str)) + getsizeof(value)
+
+        if self.size <= 0 or cost > self.memory:
+            return
+
+        with self.lock:
+            if generation != self.generation or key in self.items:
+                return
+
+            self.items[key] = (value, cost)
+            self.used += cost
+
+            while len(self.items) > self.size or self.used > self.memory:
+                _, (_, old) = self.items.popitem(last=False)
+                self.used -= old
@@ -22,11 +22,12 @@ from time import sleep
 from pyrogram import Client
 
 from .. import glovar
-from .channel import share_data
+from .channel import is_accepted, share_data
 from .etc import code, get_now, lang, mention_id, thread
-from .file import save
+from .file import bundle_to_file, data_to_file, delete_file, get_backup_entries, get_data, save, save_rules
+from .filters import remove_rule
 from .telegram import send_message
-from .words import get_comments, words_ask
+from .words import words_ask
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -35,19 +36,55 @@ logger = logging.getLogger(__name__)
 def backup_files(client: Client) -> bool:
     # Backup data files to BACKUP
     try:
+        # Send the changed files in one bundle, each file is exported while the bundle is written
+        if is_accepted(["BACKUP"], "bundle"):
+            now = get_now()
+            full = now - glovar.backups.get("full", 0) >= glovar.backup_full * 86400
+            hashes = {}
+            file = bundle_to_file(get_backup_entries(full, hashes))
+
+            # Nothing changed since the generation BACKUP acknowledged
+            if not full and hashes == glovar.backups.get("hashes", {}):
+                delete_file(file)
+                return True
+
+            generation = glovar.backups.get("sent", {}).get("generation", 0) + 1
+            glovar.backups["sent"] = {
+                "generation": generation,
+                "full": full,
+                "time": now,
+                "hashes": hashes
+            }
+            save("backups")
+            share_data(
+                client=client,
+                receivers=["BACKUP"],
+                action="backup",
+                action_type="bundle",
+                data={
+                    "generation": generation,
+                    "full": full
+                },
+                file=file
+            )
+
+            return True
+
         for file in glovar.file_list:
             # Check
-            if not eval(f"glovar.{file}"):
+            data = get_data(file)
+
+            if not data:
                 continue
 
-            # Share
+            # Share the data in memory, it is exported the same way whichever backend saves it
             share_data(
                 client=client,
                 receivers=["BACKUP"],
                 action="backup",
                 action_type="data",
                 data=file,
-                file=f"data/{file}"
+                file=data_to_file(data)
             )
             sleep(5)
 
@@ -95,25 +132,10 @@ def reset_count(client: Client) -> bool:
         for word_type in glovar.regex:
             deleted_words = {}
 
-            for word in list(eval(f"glovar.{word_type}_words")):
-                today = eval(f"glovar.{word_type}_words")[word]["today"]
-                eval(f"glovar.{word_type}_words")[word]["today"] = 0
-
-                if today == 0:
-                    eval(f"glovar.{word_type}_words")[word]["temp"] += 1
-                else:
-                    eval(f"glovar.{word_type}_words")[word]["temp"] = 0
-
-                comments = get_comments(word)
-
-                if (not any("temp" in comment for comment in comments)
-                        and not (word_type == "ban" and not any("forever" in comment for comment in comments))):
-                    continue
-
-                if eval(f"glovar.{word_type}_words")[word]["temp"] >= glovar.limit_temp:
-                    deleted_words[word] = eval(f"glovar.{word_type}_words").pop(word, {})
+            for word in glovar.rules.reset(word_type, glovar.limit_temp):
+                deleted_words[word] = remove_rule(word_type, word)
 
-            save(f"{word_type}_words")
+            save_rules(word_type)
 
             if not deleted_words:
                 continue
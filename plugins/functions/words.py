@@ -20,17 +20,17 @@ import logging
 import re
 from copy import deepcopy
 from json import dumps
-from string import ascii_lowercase
 from typing import List, Optional, Set
 
 from pyrogram import Client, InlineKeyboardMarkup, InlineKeyboardButton, Message
 
 from .. import glovar
-from .channel import share_regex_update
+from .channel import share_regex_delta
+from .engine import Normalized
 from .etc import code, button_data, get_command_context, get_int, get_list_page, get_now, get_text, italic, lang
 from .etc import mention_id, random_str, thread
-from .file import save, save_thread
-from .filters import is_similar
+from .file import save, save_rules
+from .filters import add_rule, fill_samples, get_similar, is_similar, remove_rule
 from .telegram import send_message
 
 # Enable logging
@@ -40,9 +40,10 @@ logger = logging.getLogger(__name__)
 def add_word(word_type: str, word: str, aid: int) -> bool:
     # Add a word
     try:
-        eval(f"glovar.{word_type}_words")[word] = deepcopy(glovar.default_word_status)
-        eval(f"glovar.{word_type}_words")[word]["who"] = aid
-        save_thread(f"{word_type}_words")
+        status = deepcopy(glovar.default_word_status)
+        status["who"] = aid
+        add_rule(word_type, word, status)
+        save_rules(word_type)
 
         return True
     except Exception as e:
@@ -142,31 +143,7 @@ def get_duplicated(word_type: str, word: str) -> Set[str]:
     # Get duplicated word types
     result = set()
     try:
-        if word_type in {f"ad{c}" for c in ascii_lowercase}:
-            word_type = "ad_"
-
-        # Current word type as parent
-        for w_t in glovar.contains.get(word_type, set()):
-            if w_t == "ad_":
-                for c in ascii_lowercase:
-                    if word in eval(f"glovar.ad{c}_words"):
-                        result.add(f"ad{c}")
-            else:
-                if word in eval(f"glovar.{w_t}_words"):
-                    result.add(w_t)
-
-        # Current word type as child
-        for w_t in glovar.contains:
-            if word_type not in glovar.contains[w_t]:
-                continue
-
-            if w_t == "ad_":
-                for c in ascii_lowercase:
-                    if word in eval(f"glovar.ad{c}_words"):
-                        result.add(f"ad{c}")
-            else:
-                if word in eval(f"glovar.{w_t}_words"):
-                    result.add(w_t)
+        result = glovar.rules.get_types(word) & glovar.relations.get(word_type, set())
     except Exception as e:
         logger.warning(f"Get duplicated error: {e}", exc_info=True)
 
@@ -221,10 +198,10 @@ def remove_word(word_type: str, words: List[str], aid: int) -> Set[int]:
     result = set()
     try:
         for word in words:
-            word_status = eval(f"glovar.{word_type}_words").pop(word, {})
+            word_status = remove_rule(word_type, word)
             result.add(word_status.get("who"))
 
-        save_thread(f"{word_type}_words")
+        save_rules(word_type)
         result.discard(aid)
         result = {cc_id for cc_id in list(result) if cc_id}
     except Exception as e:
@@ -285,7 +262,7 @@ def word_add(client: Client, message: Message) -> (str, InlineKeyboardMarkup):
         text += f"{lang('word')}{lang('colon')}{code(word)}\n"
 
         # Check if the word already exits
-        if eval(f"glovar.{word_type}_words").get(word, {}):
+        if word in glovar.rules[word_type]:
             text += (f"{lang('status')}{lang('colon')}{code(lang('status_failed'))}\n"
                      f"{lang('reason')}{lang('colon')}{code(lang('reason_existed'))}\n")
             return text, markup
@@ -335,9 +312,7 @@ def word_add(client: Client, message: Message) -> (str, InlineKeyboardMarkup):
             "type": word_type
         }
 
-        for old in list(eval(f"glovar.{word_type}_words")):
-            if is_similar("strict", old, word):
-                glovar.ask_words[key]["old"].append(old)
+        glovar.ask_words[key]["old"] = get_similar(word_type, word)
 
         if glovar.ask_words[key]["old"]:
             end_text = "\n\n".join(code(w) for w in glovar.ask_words[key]["old"])
@@ -374,7 +349,7 @@ def word_add(client: Client, message: Message) -> (str, InlineKeyboardMarkup):
         else:
             glovar.ask_words.pop(key, None)
             add_word(word_type, word, aid)
-            share_regex_update(client, word_type)
+            share_regex_delta(client, word_type)
             text += f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
     except Exception as e:
         logger.warning(f"Word add error: {e}", exc_info=True)
@@ -420,7 +395,7 @@ def words_ask(client: Client, operation: str, key: str) -> (str, Set[int]):
         # If admin decide to add new word
         if operation == "new":
             add_word(word_type, new_word, aid)
-            share_regex_update(client, word_type)
+            share_regex_delta(client, word_type)
             text = (f"{lang('action')}{lang('colon')}{code(lang('ask_new'))}\n"
                     f"{text}"
                     f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
@@ -430,7 +405,7 @@ def words_ask(client: Client, operation: str, key: str) -> (str, Set[int]):
         elif operation == "replace":
             add_word(word_type, new_word, aid)
             cc_list = remove_word(word_type, old_words, aid)
-            share_regex_update(client, word_type)
+            share_regex_delta(client, word_type)
             text = (f"{lang('action')}{lang('colon')}{code(lang('ask_replace'))}\n"
                     f"{text}"
                     f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
@@ -529,20 +504,25 @@ def words_list_page(aid: int, word_type: str, page: int, desc: bool) -> (str, In
                 f"{lang('action')}{lang('colon')}{code(lang('action_list'))}\n")
 
         # Get words
-        words = eval(f"glovar.{word_type}_words")
-        keys = list(words.keys())
-        keys.sort()
-        w_list = sorted(keys, key=lambda k: words[k]["average"], reverse=desc)
+        stats = glovar.rules[word_type].stats
 
         # Get the list and generate the markup
-        if w_list:
-            per_page = min(4000 // max(len(w) for w in w_list), glovar.per_page) or 1
+        if stats.words:
+            per_page = min(4000 // max(len(w) for w in stats.words), glovar.per_page) or 1
         else:
             per_page = glovar.per_page
 
-        w_list, markup = get_list_page(w_list, "list", word_type, page, per_page)
+        # The database sorts the rules with its index, only the words of the page are read
+        if glovar.database and glovar.database.commit():
+            positions, markup = get_list_page(list(range(len(stats))), "list", word_type, page, per_page)
+            w_list = glovar.database.page(word_type, positions[0], len(positions), desc) if positions else []
+        else:
+            w_list = sorted(stats, key=lambda k: (stats.average[stats.index[k]], k), reverse=desc)
+            w_list, markup = get_list_page(w_list, "list", word_type, page, per_page)
 
-        # Generate the text
+        # Generate the text, the rules removed after the page was read are skipped
+        w_list = [w for w in w_list if w in stats]
+        words = {w: stats.get(w) for w in w_list}
         end_text = f"\n\n".join((f"{code(w)}\n"
                                  f"{italic(round(words[w]['average'], 1))} {code('/')} "
                                  f"{italic(words[w]['today'])} {code('/')} "
@@ -645,7 +625,7 @@ def word_remove_try(client: Client, message: Message) -> (str, Set[int]):
         text += f"{lang('word')}{lang('colon')}{code(word)}\n"
 
         # Check if the word exists
-        if not eval(f"glovar.{word_type}_words").get(word, {}):
+        if word not in glovar.rules[word_type]:
             text += (f"{lang('status')}{lang('colon')}{code(lang('status_failed'))}\n"
                      f"{lang('reason')}{lang('colon')}{code(lang('reason_not_exist'))}\n")
 
@@ -657,7 +637,7 @@ def word_remove_try(client: Client, message: Message) -> (str, Set[int]):
         for cc_id in cc_list:
             text += f"{lang('action_cc')}{lang('colon')}{mention_id(cc_id)}\n"
 
-        share_regex_update(client, word_type)
+        share_regex_delta(client, word_type)
     except Exception as e:
         logger.warning(f"Word remove try error: {e}", exc_info=True)
 
@@ -712,19 +692,26 @@ def words_search(message: Message, mode: str) -> (str, InlineKeyboardMarkup):
         # Get the result
         result = {}
 
+        # Normalize the word once for all rules
+        target = Normalized(word) if mode == "test" else word
+
+        # The sample banks the rules do not have yet are kept in one journal entry per word type
+        if mode not in {"find", "test"}:
+            for t in (glovar.regex if word_type == "all" else [word_type]):
+                fill_samples(t)
+
         if word_type == "all":
-            for n in glovar.regex:
-                for w in eval(f"glovar.{n}_words"):
-                    if not is_similar(mode, w, word):
-                        continue
+            # Check each rule once, no matter how many word types hold it
+            for w, types in list(glovar.rules.types.items()):
+                types = [n for n in glovar.regex if n in types]
 
-                    if result.get(w) is None:
-                        result[w] = []
+                if not types or not is_similar(mode, w, target, types[0]):
+                    continue
 
-                    result[w].append(n)
+                result[w] = types
         else:
-            result = {w: [] for w in eval(f"glovar.{word_type}_words")
-                      if is_similar(mode, w, word)}
+            result = {w: [] for w in glovar.rules[word_type]
+                      if is_similar(mode, w, target, word_type)}
 
         glovar.result_search[key]["result"] = result
         text, markup = words_search_page(aid, key, 1)
@@ -779,7 +766,8 @@ def words_search_page(aid: int, key: str, page: int) -> (str, InlineKeyboardMark
                                    + italic(lang('comma').join(lang(t) for t in result[w]))
                                    for w in w_list)
         else:
-            words = eval(f"glovar.{word_type}_words")
+            stats = glovar.rules[word_type].stats
+            words = {w: stats.get(w) for w in w_list}
             end_text = "\n\n".join((f"{code(w)}\n"
                                     f"{italic(round(words[w]['average'], 1))} {code('/')} "
                                     f"{italic(words[w]['today'])} {code('/')} "
@@ -17,15 +17,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import pickle
 from configparser import RawConfigParser
 from os import mkdir
 from os.path import exists
 from shutil import rmtree
 from string import ascii_lowercase
-from threading import Lock
+from threading import Event, Lock
 from time import time
-from typing import Dict, List, Set, Union
+from typing import Dict, List, Optional, Set, Union
+
+from opencc import OpenCC
+
+from .functions.database import Database
+from .functions.journal import Journal
+from .functions.store import RuleStore
+from .functions.table import Cache, Printable, SpecialTable
 
 # Enable logging
 logging.basicConfig(
@@ -53,12 +59,25 @@ test_group_id: int = 0
 
 # [custom]
 aio: Union[bool, str] = ""
+backend: str = "pickle"
 backup: Union[bool, str] = ""
+backup_full: int = 7
+combine: Union[bool, str] = "False"
+combine_size: int = 64
+compression: str = "zlib"
 date_reset: str = ""
+delta_limit: int = 100
+journal_size: int = 1000
 limit_temp: int = 0
 per_page: int = 0
+prefilter: Union[bool, str] = "True"
 project_link: str = ""
 project_name: str = ""
+sample_size: int = 3
+save_window: int = 5
+t2t_cache_memory: int = 16
+t2t_cache_size: int = 4096
+verify: Union[bool, str] = "False"
 zh_cn: Union[bool, str] = ""
 
 # [encrypt]
@@ -84,13 +103,29 @@ try:
     # [custom]
     aio = config["custom"].get("aio", aio)
     aio = eval(aio)
+    backend = config["custom"].get("backend", backend)
     backup = config["custom"].get("backup", backup)
     backup = eval(backup)
+    backup_full = int(config["custom"].get("backup_full", str(backup_full)))
+    combine = config["custom"].get("combine", combine)
+    combine = eval(combine)
+    combine_size = int(config["custom"].get("combine_size", str(combine_size)))
+    compression = config["custom"].get("compression", compression)
     date_reset = config["custom"].get("date_reset", date_reset)
+    delta_limit = int(config["custom"].get("delta_limit", str(delta_limit)))
+    journal_size = int(config["custom"].get("journal_size", str(journal_size)))
     limit_temp = int(config["custom"].get("limit_temp", str(limit_temp)))
     per_page = int(config["custom"].get("per_page", str(per_page)))
+    prefilter = config["custom"].get("prefilter", prefilter)
+    prefilter = eval(prefilter)
     project_link = config["custom"].get("project_link", project_link)
     project_name = config["custom"].get("project_name", project_name)
+    sample_size = int(config["custom"].get("sample_size", str(sample_size)))
+    save_window = int(config["custom"].get("save_window", str(save_window)))
+    t2t_cache_memory = int(config["custom"].get("t2t_cache_memory", str(t2t_cache_memory)))
+    t2t_cache_size = int(config["custom"].get("t2t_cache_size", str(t2t_cache_size)))
+    verify = config["custom"].get("verify", verify)
+    verify = eval(verify)
     zh_cn = config["custom"].get("zh_cn", zh_cn)
     zh_cn = eval(zh_cn)
 
@@ -111,12 +146,25 @@ if (bot_token in {"", "[DATA EXPUNGED]"}
         or test_group_id == 0
         or regex_group_id == 0
         or aio not in {False, True}
+        or backend not in {"pickle", "sqlite"}
         or backup not in {False, True}
+        or backup_full <= 0
+        or combine not in {False, True}
+        or combine_size <= 0
+        or compression not in {"lzma", "none", "zlib"}
         or date_reset in {"", "[DATA EXPUNGED]"}
+        or delta_limit <= 0
+        or journal_size <= 0
         or limit_temp == 0
         or per_page == 0
+        or prefilter not in {False, True}
         or project_link in {"", "[DATA EXPUNGED]"}
         or project_name in {"", "[DATA EXPUNGED]"}
+        or sample_size <= 0
+        or save_window < 0
+        or t2t_cache_memory < 0
+        or t2t_cache_size < 0
+        or verify not in {False, True}
         or zh_cn not in {False, True}
         or key in {b"", b"[DATA EXPUNGED]", "", "[DATA EXPUNGED]"}
         or password in {"", "[DATA EXPUNGED]"}):
@@ -221,12 +269,17 @@ lang: Dict[str, str] = {
     "action_reset": (zh_cn and "重置计数") or "Reset Count",
     "action_same": (zh_cn and "复制命令") or "Copy Command",
     "action_search": (zh_cn and "查询规则") or "Search Rules",
+    "action_status": (zh_cn and "运行状态") or "Running Status",
     "action_who": (zh_cn and "查询添加者") or "Find the Adder",
     "all": (zh_cn and "全部") or "All",
     "ask_new": (zh_cn and "另增新词") or "Add as New",
     "ask_replace": (zh_cn and "替换全部") or "Replace All",
+    "cache_hit": (zh_cn and "缓存命中") or "Cache Hit",
+    "cache_miss": (zh_cn and "缓存未命中") or "Cache Miss",
     "cancel": (zh_cn and "取消") or "Cancel",
     "comment": (zh_cn and "备注") or "Comment",
+    "compiled": (zh_cn and "已编译规则") or "Compiled Rules",
+    "compression": (zh_cn and "压缩率") or "Compression Ratio",
     "duplicated": (zh_cn and "重复") or "Duplicated",
     "expired": (zh_cn and "会话已失效") or "Session Expired",
     "find": (zh_cn and "包含搜索") or "Include Search",
@@ -244,8 +297,14 @@ lang: Dict[str, str] = {
     "removed": (zh_cn and "移除") or "Removed",
     "replaced": (zh_cn and "替换") or "Replaced",
     "s": (zh_cn and "宽松搜索") or "Loose Search",
+    "save_latency": (zh_cn and "保存耗时") or "Save Latency",
+    "save_queue": (zh_cn and "保存队列") or "Save Queue",
     "search": (zh_cn and "正则搜索") or "REGEX Search",
+    "startup": (zh_cn and "启动耗时") or "Startup Time",
     "t2t": (zh_cn and "文字转换") or "Text Transfer",
+    "t2t_hit": (zh_cn and "转换缓存命中") or "Text Transfer Cache Hit",
+    "t2t_miss": (zh_cn and "转换缓存未命中") or "Text Transfer Cache Miss",
+    "t2t_rate": (zh_cn and "转换缓存命中率") or "Text Transfer Cache Hit Rate",
     "type": (zh_cn and "类别") or "Type",
     "unknown": (zh_cn and "未知") or "Unknown",
     "valid_types": (zh_cn and "可选类别") or "Valid Types",
@@ -262,6 +321,12 @@ for c in ascii_lowercase:
 
 # Init
 
+# Bundle, delta and compression formats each bot reads, learned from the "accept" key of its exchange messages
+accepts: Dict[str, Set[str]] = {}
+# accepts = {
+#     "CLEAN": {"bundle", "delta", "lzma", "zlib"}
+# }
+
 add_commands: List[str] = ["ad", "add"]
 list_commands: List[str] = ["list", "ls"]
 remove_commands: List[str] = ["rm", "remove"]
@@ -285,11 +350,27 @@ all_commands += [
     "push",
     "regex",
     "reset",
+    "status",
     "t2t",
     "version",
     "who"
 ]
 
+compiled_count: Dict[str, int] = {
+    "hit": 0,
+    "miss": 0
+}
+
+compress_count: Dict[str, Dict[str, Union[float, int]]] = {}
+# compress_count = {
+#     "ad_words": {
+#         "size": 123456,
+#         "compressed": 12345,
+#         "compress": 0.12,
+#         "decompress": 0.01
+#     }
+# }
+
 contains: Dict[str, Set[str]] = {
     "con": {"iml", "pho"},
     "nm": {"bio"},
@@ -307,8 +388,11 @@ default_word_status: Dict[str, Union[float, int]] = {
 }
 
 locks: Dict[str, Lock] = {
+    "engine": Lock(),
+    "queue": Lock(),
     "receive": Lock(),
     "regex": Lock(),
+    "save": Lock(),
     "test": Lock()
 }
 
@@ -366,6 +450,31 @@ regex: Dict[str, bool] = {
 for c in ascii_lowercase:
     regex[f"ad{c}"] = True
 
+relations: Dict[str, Set[str]] = {word_type: set() for word_type in regex}
+# relations = {
+#     "con": {"iml", "pho", "wd"}
+# }
+
+# Relate each word type to the word types it contains, directly or not, and the other way round
+for parent in contains:
+    children = set(contains[parent])
+    grandchildren = set().union(*(contains.get(child, set()) for child in children)) - children
+
+    while grandchildren:
+        children |= grandchildren
+        grandchildren = set().union(*(contains.get(child, set()) for child in children)) - children
+
+    parents = {f"ad{c}" for c in ascii_lowercase} if parent == "ad_" else {parent}
+
+    if "ad_" in children:
+        children = (children - {"ad_"}) | {f"ad{c}" for c in ascii_lowercase}
+
+    for word_type in parents:
+        relations[word_type] |= children
+
+    for word_type in children:
+        relations[word_type] |= parents
+
 result_search: Dict[str, Dict[str, Union[str, Dict[str, List[str]]]]] = {}
 # result_search = {
 #     "random": {
@@ -377,6 +486,20 @@ result_search: Dict[str, Dict[str, Union[str, Dict[str, List[str]]]]] = {}
 #     }
 # }
 
+save_count: Dict[str, Union[float, int]] = {
+    "flush": 0,
+    "latency": 0.0,
+    "wait": 0.0
+}
+
+# Set when a file is waiting in the save queue
+save_event: Event = Event()
+
+save_queue: Dict[str, float] = {}
+# save_queue = {
+#     "file": 1512345678.9
+# }
+
 sender: str = "REGEX"
 
 should_hide: bool = False
@@ -415,17 +538,52 @@ ask_words: Dict[str, Dict[str, Union[bool, int, str, List[str]]]] = {}
 #     }
 # }
 
+# What BACKUP has acknowledged, and the last generation sent to it
+backups: Dict[str, Union[int, Dict[str, str], Dict[str, Union[bool, int, Dict[str, str]]]]] = {}
+# backups = {
+#     "full": 1512345678,
+#     "hashes": {
+#         "ad_words": "hash"
+#     },
+#     "sent": {
+#         "generation": 2,
+#         "full": False,
+#         "time": 1512345678,
+#         "hashes": {
+#             "ad_words": "hash"
+#         }
+#     }
+# }
+
 comments: Dict[str, str] = {}
 # comments = {
 #     "ada": "ADA"
 # }
 
-# Init word variables
+# Load data
+file_list: List[str] = ["ask_words", "backups", "comments"]
+file_list += [f"{f}_words" for f in regex]
+
+# The SQLite backend keeps all files in one database, the pickle files are only read once to fill it
+database: Optional[Database] = (backend == "sqlite" and Database("data/regex.db", regex)) or None
+
+# The files are loaded by a background thread started in main.py, the handlers wait until it is done
+loaded: bool = False
+ready: Event = Event()
+
+# Files read from their previous copy, because the file itself is broken
+fallbacks: Set[str] = set()
 
-for word_type in regex:
-    locals()[f"{word_type}_words"]: Dict[str, Dict[str, Union[float, int]]] = {}
+startup_times: Dict[str, float] = {}
+# startup_times = {
+#     "ad_words": 0.12,
+#     "files": 1.23
+# }
 
-# type_words = {
+# Rules of all word types, it keeps the statistics as columns and indexes the word types holding each rule
+rules: RuleStore = RuleStore(regex, {word_type: database.table(word_type) if database
+                                     else Journal(f"data/{word_type}_words") for word_type in regex})
+# rules.export("type") = {
 #     "regex": {
 #         "time": 15112345678,
 #         "average": 1.1,
@@ -436,46 +594,16 @@ for word_type in regex:
 #     }
 # }
 
-# Load data
-file_list: List[str] = ["ask_words", "comments"]
-file_list += [f"{f}_words" for f in regex]
+# Translate tables used by t2t, the special characters table is filled by the loaded rules and then updated
+# by every added or removed rule
+printable_table: Printable = Printable()
+t2t_table: SpecialTable = SpecialTable()
+
+# Results of t2t, cleared whenever the special characters table changes
+t2t_cache: Cache = Cache(t2t_cache_size, t2t_cache_memory * 1024 * 1024)
 
-for file in file_list:
-    try:
-        try:
-            if exists(f"data/{file}") or exists(f"data/.{file}"):
-                with open(f"data/{file}", "rb") as f:
-                    locals()[f"{file}"] = pickle.load(f)
-            else:
-                with open(f"data/{file}", "wb") as f:
-                    pickle.dump(eval(f"{file}"), f)
-        except Exception as e:
-            logger.error(f"Load data {file} error: {e}", exc_info=True)
-
-            with open(f"data/.{file}", "rb") as f:
-                locals()[f"{file}"] = pickle.load(f)
-    except Exception as e:
-        logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
-        raise SystemExit("[DATA CORRUPTION]")
-
-# Generate special characters dictionary
-for special in ["spc", "spe"]:
-    locals()[f"{special}_dict"]: Dict[str, str] = {}
-
-    for rule in locals()[f"{special}_words"]:
-        # Check keys
-        if "[" not in rule:
-            continue
-
-        # Check value
-        if "?#" not in rule:
-            continue
-
-        keys = rule.split("]")[0][1:]
-        value = rule.split("?#")[1][1]
-
-        for k in keys:
-            locals()[f"{special}_dict"][k] = value
+# Keep one converter, so the OpenCC config is not loaded on every conversion
+converter: Optional[OpenCC] = (zh_cn and OpenCC(config="t2s.json")) or None
 
 # Start program
 copyright_text = (f"SCP-079-{sender} v{version}, Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>\n"
@@ -31,6 +31,12 @@ from ..functions.telegram import answer_callback, edit_message_reply_markup, edi
 logger = logging.getLogger(__name__)
 
 
+@Client.on_callback_query(group=-1)
+def wait_ready(client: Client, callback_query: CallbackQuery) -> bool:
+    # Hold the callback queries until the data is loaded
+    return glovar.ready.wait()
+
+
 @Client.on_callback_query(regex_group)
 def answer(client: Client, callback_query: CallbackQuery) -> bool:
     # Answer the callback query
@@ -25,11 +25,11 @@ from subprocess import run, PIPE
 from pyrogram import Client, Filters, Message
 
 from .. import glovar
-from ..functions.channel import share_data, share_regex_update
+from ..functions.channel import share_data, share_regex_bundle, share_regex_update
 from ..functions.etc import code, code_block, general_link, get_callback_data, get_command_context, get_command_type
 from ..functions.etc import get_filename, get_forward_name, get_int, get_readable_time, get_text, italic, lang
 from ..functions.etc import mention_id, message_link, thread
-from ..functions.file import save
+from ..functions.file import save, save_rules
 from ..functions.filters import from_user, regex_group, test_group
 from ..functions.group import get_message
 from ..functions.telegram import edit_message_text, send_message
@@ -200,7 +200,7 @@ def check(client: Client, message: Message) -> bool:
         word_type, word = get_command_context(message)
 
         if word_type and word_type in glovar.regex and word:
-            words = eval(f"glovar.{word_type}_words")
+            stats = glovar.rules[word_type].stats
 
             text += f"{lang('type')}{lang('colon')}{code(lang(word_type))}\n"
 
@@ -209,11 +209,12 @@ def check(client: Client, message: Message) -> bool:
 
             text += f"{lang('word')}{lang('colon')}{code(word)}\n"
 
-            if word in words:
-                count_text = (f"{italic(round(words[word]['average'], 1))} {code('/')} "
-                              f"{italic(words[word]['today'])} {code('/')} "
-                              f"{italic(words[word]['total'])} {code('/')} "
-                              f"{italic(words[word]['temp'])}")
+            if word in stats:
+                status = stats.get(word)
+                count_text = (f"{italic(round(status['average'], 1))} {code('/')} "
+                              f"{italic(status['today'])} {code('/')} "
+                              f"{italic(status['total'])} {code('/')} "
+                              f"{italic(status['temp'])}")
                 text += (f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
                          f"{lang('result')}{lang('colon')}{count_text}\n")
             else:
@@ -515,8 +516,7 @@ def push_words(client: Client, message: Message) -> bool:
 
             text += f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
         elif command_type == "all":
-            for word_type in glovar.regex:
-                thread(share_regex_update, (client, word_type))
+            share_regex_bundle(client, list(glovar.regex))
 
             text += (f"{lang('type')}{lang('colon')}{code(lang('all'))}\n"
                      f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n")
@@ -656,10 +656,8 @@ def reset_words(client: Client, message: Message) -> bool:
         command_type = get_command_type(message)
 
         if command_type in glovar.regex:
-            for word in list(eval(f"glovar.{command_type}_words")):
-                eval(f"glovar.{command_type}_words")[word] = deepcopy(glovar.default_word_status)
-
-            save(f"{command_type}_words")
+            glovar.rules.fill(command_type, deepcopy(glovar.default_word_status))
+            save_rules(command_type)
 
             text += f"{lang('type')}{lang('colon')}{code(lang(command_type))}\n"
 
@@ -669,10 +667,8 @@ def reset_words(client: Client, message: Message) -> bool:
             text += f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
         elif command_type == "all":
             for word_type in glovar.regex:
-                for word in list(eval(f"glovar.{word_type}_words")):
-                    eval(f"glovar.{word_type}_words")[word] = deepcopy(glovar.default_word_status)
-
-                save(f"{word_type}_words")
+                glovar.rules.fill(word_type, deepcopy(glovar.default_word_status))
+                save_rules(word_type)
 
             text += (f"{lang('type')}{lang('colon')}{code(lang('all'))}\n"
                      f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n")
@@ -808,12 +804,70 @@ def search_words(client: Client, message: Message) -> bool:
     return False
 
 
+@Client.on_message(Filters.incoming & Filters.group & Filters.command(["status"], glovar.prefix)
+                   & test_group
+                   & from_user)
+def status(client: Client, message: Message) -> bool:
+    # Show the running status
+    try:
+        # Basic data
+        cid = message.chat.id
+        aid = message.from_user.id
+        mid = message.message_id
+
+        # Compiled patterns
+        compiled = sum(len(glovar.rules[word_type].compiled) for word_type in glovar.rules)
+
+        # Text transfer cache
+        t2t_hit = glovar.t2t_cache.hit
+        t2t_miss = glovar.t2t_cache.miss
+        t2t_rate = f"{t2t_hit / ((t2t_hit + t2t_miss) or 1):.2%}"
+
+        # Startup time of each phase, and the slowest file
+        phases = ["files", "rules", "tables", "client", "ready"]
+        startup = " / ".join(f"{p} {glovar.startup_times.get(p, 0):.2f}s" for p in phases)
+        slowest = max(glovar.file_list, key=lambda f: glovar.startup_times.get(f, 0))
+        startup += f" / {slowest} {glovar.startup_times.get(slowest, 0):.2f}s"
+
+        # Save queue
+        save_queue = len(glovar.save_queue)
+        save_latency = f"{glovar.save_count['latency'] * 1000:.0f} ms / {glovar.save_count['wait']:.1f} s"
+
+        # Exchange compression
+        size = sum(count["size"] for count in glovar.compress_count.values())
+        compressed = sum(count["compressed"] for count in glovar.compress_count.values())
+        compress_time = sum(count["compress"] + count["decompress"] for count in glovar.compress_count.values())
+        compression = f"{compressed / (size or 1):.2%} / {compress_time:.2f} s"
+
+        # Generate the text
+        text = (f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n"
+                f"{lang('action')}{lang('colon')}{code(lang('action_status'))}\n"
+                f"{lang('compiled')}{lang('colon')}{code(compiled)}\n"
+                f"{lang('cache_hit')}{lang('colon')}{code(glovar.compiled_count['hit'])}\n"
+                f"{lang('cache_miss')}{lang('colon')}{code(glovar.compiled_count['miss'])}\n"
+                f"{lang('t2t_hit')}{lang('colon')}{code(t2t_hit)}\n"
+                f"{lang('t2t_miss')}{lang('colon')}{code(t2t_miss)}\n"
+                f"{lang('t2t_rate')}{lang('colon')}{code(t2t_rate)}\n"
+                f"{lang('save_queue')}{lang('colon')}{code(save_queue)}\n"
+                f"{lang('save_latency')}{lang('colon')}{code(save_latency)}\n"
+                f"{lang('compression')}{lang('colon')}{code(compression)}\n"
+                f"{lang('startup')}{lang('colon')}{code(startup)}\n")
+
+        # Send the report message
+        thread(send_message, (client, cid, text, mid))
+
+        return True
+    except Exception as e:
+        logger.warning(f"Status error: {e}", exc_info=True)
+
+    return False
+
+
 @Client.on_message(Filters.incoming & Filters.group & Filters.command(["t2t"], glovar.prefix)
                    & test_group
                    & from_user)
 def text_t2t(client: Client, message: Message) -> bool:
     # Transfer text
-    glovar.locks["regex"].acquire()
     try:
         # Basic data
         cid = message.chat.id
@@ -828,26 +882,6 @@ def text_t2t(client: Client, message: Message) -> bool:
         command_type = get_command_type(message)
 
         if message.reply_to_message:
-            # Regenerate special characters dictionary if possible
-            for file_name in {"spc_words", "spe_words"}:
-                special = file_name.split("_")[0]
-                exec(f"glovar.{special}_dict = {{}}")
-
-                for rule in list(eval(f"glovar.{file_name}")):
-                    # Check keys
-                    if "[" not in rule:
-                        continue
-
-                    # Check value
-                    if "?#" not in rule:
-                        continue
-
-                    keys = rule.split("]")[0][1:]
-                    value = rule.split("?#")[1][1]
-
-                    for k in keys:
-                        eval(f"glovar.{special}_dict")[k] = value
-
             result = ""
 
             forward_name = get_forward_name(message.reply_to_message, True, True)
@@ -886,8 +920,6 @@ def text_t2t(client: Client, message: Message) -> bool:
         return True
     except Exception as e:
         logger.warning(f"Text t2t error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
 
     return False
 
@@ -957,7 +989,7 @@ def who(client: Client, message: Message) -> bool:
         word_type, word = get_command_context(message)
 
         if word_type and word_type in glovar.regex and word:
-            words = eval(f"glovar.{word_type}_words")
+            stats = glovar.rules[word_type].stats
 
             text += f"{lang('type')}{lang('colon')}{code(lang(word_type))}\n"
 
@@ -966,8 +998,8 @@ def who(client: Client, message: Message) -> bool:
 
             text += f"{lang('word')}{lang('colon')}{code(word)}\n"
 
-            if word in words:
-                uid = words[word].get("who", 0)
+            if word in stats:
+                uid = stats.get(word)["who"]
                 text += (f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
                          f"{lang('result')}{lang('colon')}{code(uid)}\n")
             else:
@@ -23,7 +23,8 @@ from pyrogram import Client, Filters, Message
 from .. import glovar
 from ..functions.etc import code, general_link, lang, thread
 from ..functions.filters import aio, exchange_channel, from_user, hide_channel, test_group
-from ..functions.receive import receive_captcha_data, receive_count, receive_status_ask, receive_text_data
+from ..functions.receive import receive_backup_reply, receive_captcha_data, receive_count, receive_regex_bundle
+from ..functions.receive import receive_regex_request, receive_regex_sync, receive_status_ask, receive_text_data
 from ..functions.telegram import send_message
 from ..functions.tests import name_test, sticker_test, text_test
 
@@ -31,6 +32,12 @@ from ..functions.tests import name_test, sticker_test, text_test
 logger = logging.getLogger(__name__)
 
 
+@Client.on_message(group=-2)
+def wait_ready(client: Client, message: Message) -> bool:
+    # Hold the messages until the data is loaded
+    return glovar.ready.wait()
+
+
 @Client.on_message(Filters.incoming & Filters.channel & ~Filters.command(glovar.all_commands, glovar.prefix)
                    & hide_channel, group=-1)
 def exchange_emergency(client: Client, message: Message) -> bool:
@@ -92,6 +99,10 @@ def process_data(client: Client, message: Message) -> bool:
         receivers = data["to"]
         action = data["action"]
         action_type = data["type"]
+
+        # Learn the formats the sender reads, older bots do not tell any
+        glovar.accepts[sender] = set(data.get("accept") or [])
+
         data = data["data"]
 
         # This will look awkward,
@@ -100,63 +111,139 @@ def process_data(client: Client, message: Message) -> bool:
         # so it is intentionally written like this
         if glovar.sender in receivers:
 
-            if sender == "CAPTCHA":
+            if sender == "AVATAR":
+
+                if action == "regex":
+                    if action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
+
+            elif sender == "BACKUP":
+
+                if action == "backup":
+                    if action_type == "reply":
+                        receive_backup_reply(data)
+
+            elif sender == "CAPTCHA":
 
                 if action == "captcha":
                     if action_type == "result":
                         receive_captcha_data(client, message, data)
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "CLEAN":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "LANG":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "LONG":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "NOFLOOD":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "NOPORN":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "NOSPAM":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "RECHECK":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
+
+            elif sender == "TIP":
+
+                if action == "regex":
+                    if action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "WATCH":
 
                 if action == "regex":
-                    if action_type == "count":
+                    if action_type == "bundle":
+                        receive_regex_bundle(client, message, sender)
+                    elif action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "sync":
+                        receive_regex_sync(client, sender, data)
 
             elif sender == "MANAGE":
 
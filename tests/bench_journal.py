@@ -0,0 +1,123 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Write amplification of the rules journal, compared with rewriting the {type}_words file after every change
+# Run "python tests/bench_journal.py" in the project directory, it does not need the config.ini of the bot
+
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+from os.path import abspath, dirname, getsize
+from shutil import copyfile
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins.functions.journal import Journal
+from plugins.functions.store import RuleStore
+
+# Rules of the word type, changes made to them, and the journal_size of the config
+rules = 5000
+changes = 2000
+journal_size = 1000
+
+
+def get_journal_size(path: str) -> int:
+    # Get the bytes of the journal segments on disk
+    return sum(getsize(f"{path}.journal.{segment}") for segment in Journal(path).segments())
+
+
+def old_save(path: str, data: dict) -> int:
+    # The save_thread before the journal, the file is dumped to .{file} and copied to {file}, get the bytes written
+    hidden = f"{dirname(path)}/.ad_words"
+
+    with open(hidden, "wb") as f:
+        pickle.dump(data, f)
+
+    copyfile(hidden, path)
+
+    return getsize(hidden) + getsize(path)
+
+
+def write(path: str, data: dict) -> int:
+    # Replace the file the way file.write_data does, get the bytes written
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(f"{path}.tmp", path)
+
+    return getsize(path)
+
+
+def main() -> None:
+    rng = random.Random(3)
+    status = {"time": 1500000000, "average": 1.5, "today": 3, "total": 40, "temp": 0, "who": 123456789}
+    words = {f"rule{i}(?# x)[a-z]{{2,}}": dict(status) for i in range(rules)}
+    path = f"{tempfile.mkdtemp()}/ad_words"
+
+    # The old way, the whole file after every change
+    old = 0
+    start = perf_counter()
+
+    for i in range(changes):
+        words[f"rule{rng.randrange(rules)}(?# x)[a-z]{{2,}}"]["today"] += 1
+        old += old_save(path, words)
+
+    old_time = perf_counter() - start
+
+    # The journal, one record per change and a snapshot every journal_size records
+    store = RuleStore(["ad"], {"ad": Journal(path)})
+    store.load("ad", words)
+    journal = store.journals["ad"]
+    new = 0
+    snapshots = 0
+    start = perf_counter()
+
+    for i in range(changes):
+        if rng.random() < 0.2:
+            store.add("ad", f"new{i}", dict(status))
+        else:
+            store.count("ad", {f"rule{rng.randrange(rules)}(?# x)[a-z]{{2,}}": 1}, 1500086400)
+
+        if len(journal) >= journal_size:
+            new += get_journal_size(path)
+
+            with journal.saving:
+                data, segment = store.snapshot("ad")
+                new += write(path, data)
+                journal.prune(segment)
+
+            snapshots += 1
+
+    new += get_journal_size(path)
+    new_time = perf_counter() - start
+    shutil.rmtree(dirname(path))
+
+    print(f"{rules} rules, {changes} changes, file {len(pickle.dumps(words)) / 1024:.0f} KiB")
+    print(f"rewrite: {old / 2 ** 20:.1f} MiB written in {old_time:.2f}s")
+    print(f"journal: {new / 2 ** 20:.1f} MiB written in {new_time:.2f}s, {snapshots} snapshots, "
+          f"{old / new:.0f}x less")
+
+
+if __name__ == "__main__":
+    main()
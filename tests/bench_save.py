@@ -0,0 +1,109 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Disk writes of saving a {type}_words file: the old save_thread, the atomic snapshot, and one journal record
+# Run "python tests/bench_save.py" in the project directory, it does not need the config.ini of the bot
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from os.path import abspath, dirname, exists, getsize
+from shutil import copyfile
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins.functions.journal import Journal
+from plugins.functions.store import RuleStore
+
+# Rule set sizes of our word types, and the saves timed for each
+sizes = [1000, 5000, 20000]
+rounds = 20
+
+
+def old_save(path: str, data: dict) -> int:
+    # The save_thread before the snapshots, the file is dumped to .{file} and copied to {file}, get the bytes written
+    hidden = f"{dirname(path)}/.ad_words"
+
+    with open(hidden, "wb") as f:
+        pickle.dump(data, f)
+
+    copyfile(hidden, path)
+
+    return getsize(hidden) + getsize(path)
+
+
+def new_save(path: str, data: dict) -> int:
+    # The snapshot of file.write_data, written once, fsynced and swapped in, get the bytes written
+    hidden = f"{dirname(path)}/.ad_words"
+
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if exists(path):
+        if exists(hidden):
+            os.remove(hidden)
+
+        os.link(path, hidden)
+
+    os.replace(f"{path}.tmp", path)
+
+    return getsize(path)
+
+
+def main() -> None:
+    status = {"time": 1500000000, "average": 1.5, "today": 3, "total": 40, "temp": 0, "who": 123456789}
+
+    for size in sizes:
+        words = {f"rule{i}(?# x)[a-z]{{2,}}": dict(status) for i in range(size)}
+        directory = tempfile.mkdtemp()
+        path = f"{directory}/ad_words"
+        results = []
+
+        for save in [old_save, new_save]:
+            written = 0
+            start = perf_counter()
+
+            for _ in range(rounds):
+                written += save(path, words)
+
+            results.append((save.__name__, written / rounds, (perf_counter() - start) / rounds))
+
+        # One change of a rule goes to the journal, the snapshot is only written when the journal is long
+        store = RuleStore(["ad"], {"ad": Journal(path)})
+        store.load("ad", words)
+        start = perf_counter()
+
+        for i in range(rounds):
+            store.count("ad", {f"rule{i}(?# x)[a-z]{{2,}}": 1}, 1500086400)
+
+        store.journals["ad"].rotate()
+        journal = sum(getsize(f"{path}.journal.{segment}") for segment in store.journals["ad"].segments())
+        results.append(("journal", journal / rounds, (perf_counter() - start) / rounds))
+        shutil.rmtree(directory)
+
+        print(f"{size} rules: " + ", ".join(f"{name} {written / 1024:.1f} KiB {spent * 1000:.2f} ms"
+                                            for name, written, spent in results))
+
+
+if __name__ == "__main__":
+    main()
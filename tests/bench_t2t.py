@@ -0,0 +1,123 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare etc.t2t with the per-character version it replaced, on a mixed CJK/Latin corpus
+# Run "python tests/bench_t2t.py" in the project directory, it needs the config.ini of the bot
+
+import random
+import sys
+from os.path import abspath, dirname
+from time import perf_counter
+from unicodedata import normalize
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins import glovar
+from plugins.functions.etc import t2t
+
+# Characters of the corpus, some of them are changed by NFKC or are not printable
+pool = ([chr(c) for c in range(0x4e00, 0x4e00 + 300)] + list("abcdefXYZ0123 ,.!?")
+        + ["​", "‮", "\x00", "\n", "\t", "ｆ", "①", "Ａ", "　", "ﬁ", "é"])
+
+# Special characters dicts read by the old t2t, the way the old glovar kept them
+dicts = {}
+
+
+def get_rules(size: int) -> list:
+    # Get random special characters rules, such as "[аa](?# a)"
+    return [f"[{''.join(random.sample(pool[:300], 2))}](?# {random.choice(pool)})" for _ in range(size)]
+
+
+def get_dict(rules: list) -> dict:
+    # Get the special characters dict the way the old glovar built it, the rule added last wins
+    result = {}
+
+    for rule in rules:
+        keys = rule.split("]")[0][1:]
+        value = rule.split("?#")[1][1]
+
+        for k in keys:
+            result[k] = value
+
+    return result
+
+
+def old_t2t(text: str, normal: bool, printable: bool) -> str:
+    # The t2t before the translate tables, without the OpenCC step
+    if not text:
+        return ""
+
+    if normal:
+        for special in ["spc", "spe"]:
+            text = "".join(eval(f"dicts['{special}']").get(t, t) for t in text)
+
+        text = normalize("NFKC", text)
+
+    if printable:
+        text = "".join(t for t in text if t.isprintable() or t in {"\n", "\r", "\t"})
+
+    return text
+
+
+def main() -> None:
+    random.seed(6)
+    glovar.zh_cn = False
+    rules = {special: get_rules(60) for special in ["spc", "spe"]}
+    dicts.update({special: get_dict(rules[special]) for special in rules})
+
+    for special in rules:
+        for rule in rules[special]:
+            glovar.t2t_table.add(special, rule)
+
+    corpus = ["".join(random.choice(pool) for _ in range(random.randint(0, 200))) for _ in range(5000)]
+
+    for normal, printable in [(False, False), (False, True), (True, False), (True, True)]:
+        start = perf_counter()
+        old = [old_t2t(text, normal, printable) for text in corpus]
+        middle = perf_counter()
+
+        # The cache is cleared, so every text is converted
+        glovar.t2t_cache.clear()
+        new = [t2t(text, normal, printable) for text in corpus]
+        end = perf_counter()
+
+        mismatches = sum(a != b for a, b in zip(old, new))
+        print(f"normal={normal} printable={printable} mismatches={mismatches} "
+              f"old={middle - start:.3f}s new={end - middle:.3f}s")
+
+    # The converter gain needs the OpenCC library, the pure Python steps above do not
+    try:
+        import opencc
+
+        opencc.libopencc
+    except Exception as e:
+        print(f"OpenCC skipped: {e}")
+        return
+
+    start = perf_counter()
+    old = [opencc.convert(text, config="t2s.json") for text in corpus]
+    middle = perf_counter()
+    converter = opencc.OpenCC(config="t2s.json")
+    new = [converter.convert(text) for text in corpus]
+    end = perf_counter()
+    print(f"OpenCC mismatches={sum(a != b for a, b in zip(old, new))} "
+          f"convert={middle - start:.3f}s converter={end - middle:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Crash safety of the rules journal, the writer is killed while it appends or writes snapshots
+# Run "python tests/test_journal.py" in the project directory, it does not need the config.ini of the bot
+
+import logging
+import multiprocessing
+import os
+import pickle
+import random
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import unittest
+from os.path import abspath, dirname, exists, getsize
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins.functions.journal import Journal
+from plugins.functions.store import RuleStore
+
+# The torn tails are expected here
+logging.disable(logging.WARNING)
+
+
+def get_status(i: int) -> dict:
+    # Get the status of the i-th rule, it tells the rule's position in the writing order
+    return {"time": 1500000000, "average": 0.0, "today": 0, "total": i, "temp": 0, "who": i}
+
+
+def load(path: str, previous: bool = False) -> dict:
+    # Load the snapshot, or the previous one, and replay the journal, the way the bot starts
+    store = RuleStore(["ad"], {"ad": Journal(path)})
+    file = f"{dirname(path)}/.ad_words" if previous else path
+
+    if exists(file):
+        with open(file, "rb") as f:
+            store.load("ad", pickle.load(f))
+
+    store.replay("ad", previous)
+
+    return store.export("ad")
+
+
+def write(path: str, data: dict) -> None:
+    # Replace the snapshot, the way file.write_data does, the replaced one is kept as the previous file
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if exists(path):
+        if exists(f"{dirname(path)}/.ad_words"):
+            os.remove(f"{dirname(path)}/.ad_words")
+
+        os.link(path, f"{dirname(path)}/.ad_words")
+
+    os.replace(f"{path}.tmp", path)
+
+
+def writer(path: str, size: int) -> None:
+    # Add rules one by one forever, take a snapshot every "size" rules
+    store = RuleStore(["ad"], {"ad": Journal(path)})
+    journal = store.journals["ad"]
+    i = 0
+
+    while True:
+        store.add("ad", f"w{i}", get_status(i))
+        i += 1
+
+        if size and len(journal) >= size:
+            with journal.saving:
+                data, segment = store.snapshot("ad")
+                write(path, data)
+                journal.prune(segment)
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.path = f"{self.dir}/ad_words"
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.dir)
+
+    def assert_prefix(self, words: dict) -> None:
+        # The rules are w0 to wN without gaps, each with its own status
+        self.assertEqual(set(words), {f"w{i}" for i in range(len(words))})
+
+        for word, status in words.items():
+            self.assertEqual(status, get_status(int(word[1:])))
+
+    def kill(self, size: int) -> None:
+        # Kill the writer at random moments, the state read back is always a prefix of what was written
+        context = multiprocessing.get_context("fork")
+        rng = random.Random(size)
+
+        for _ in range(8):
+            process = context.Process(target=writer, args=(self.path, size))
+            process.start()
+            time.sleep(rng.uniform(0.05, 0.3))
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+            words = load(self.path)
+            self.assert_prefix(words)
+            self.assertTrue(words)
+            shutil.rmtree(self.dir)
+            os.mkdir(self.dir)
+
+    def test_kill_during_append(self) -> None:
+        self.kill(0)
+
+    def test_kill_during_snapshot(self) -> None:
+        self.kill(20)
+
+    def test_torn_tail(self) -> None:
+        # Every truncation of the last segment loses only the records after the cut
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+
+        for i in range(30):
+            store.add("ad", f"w{i}", get_status(i))
+
+        store.journals["ad"].rotate()
+        segment = f"{self.path}.journal.1"
+        size = getsize(segment)
+
+        with open(segment, "rb") as f:
+            data = f.read()
+
+        for cut in range(size + 1):
+            with open(segment, "wb") as f:
+                f.write(data[:cut])
+
+            words = load(self.path)
+            self.assert_prefix(words)
+
+        self.assertEqual(len(words), 30)
+
+    def test_replay_after_crash_before_prune(self) -> None:
+        # The snapshot is written but the old segments are not deleted, replaying them again changes nothing
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+
+        for i in range(10):
+            store.add("ad", f"w{i}", get_status(i))
+
+        store.count("ad", {"w3": 2}, 1500086400)
+        data, _ = store.snapshot("ad")
+        write(self.path, data)
+
+        self.assertEqual(load(self.path), store.export("ad"))
+
+    def test_reset(self) -> None:
+        # The daily reset is one small record, replaying it gives the same counters
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+
+        for i in range(50):
+            store.add("ad", f"w{i}", dict(get_status(i), today=i % 3, temp=i % 4))
+
+        size = getsize(f"{self.path}.journal.1")
+        store.reset("ad", 3)
+
+        self.assertLess(getsize(f"{self.path}.journal.1") - size, 64)
+        self.assertEqual(load(self.path), store.export("ad"))
+
+    def test_fill(self) -> None:
+        # Resetting the statuses of all rules is one small record, replaying it gives the same statuses
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+
+        for i in range(50):
+            store.add("ad", f"w{i}", get_status(i))
+
+        size = getsize(f"{self.path}.journal.1")
+        store.fill("ad", get_status(0))
+
+        self.assertLess(getsize(f"{self.path}.journal.1") - size, 256)
+        self.assertEqual(load(self.path), store.export("ad"))
+        self.assertEqual(load(self.path)["w7"], get_status(0))
+
+    def test_previous_file(self) -> None:
+        # The previous file and the segments kept for it give the same rules as the file and its journal
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+        journal = store.journals["ad"]
+
+        for i in range(40):
+            store.add("ad", f"w{i}", get_status(i))
+
+            if i % 7 == 6:
+                with journal.saving:
+                    data, segment = store.snapshot("ad")
+                    write(self.path, data)
+                    journal.prune(segment)
+
+        self.assertEqual(load(self.path), store.export("ad"))
+        self.assertEqual(load(self.path, True), store.export("ad"))
+        self.assertEqual(journal.segments(True), [journal.segment - 1])
+
+    def test_append_after_recovery(self) -> None:
+        # New records go to a new segment, never after a torn tail
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+
+        for i in range(5):
+            store.add("ad", f"w{i}", get_status(i))
+
+        store.journals["ad"].rotate()
+
+        with open(f"{self.path}.journal.1", "r+b") as f:
+            f.truncate(getsize(f"{self.path}.journal.1") - 3)
+
+        store = RuleStore(["ad"], {"ad": Journal(self.path)})
+        store.replay("ad")
+        store.add("ad", "w4", get_status(4))
+        store.journals["ad"].rotate()
+
+        self.assert_prefix(load(self.path))
+        self.assertEqual(len(load(self.path)), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()